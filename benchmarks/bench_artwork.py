@@ -0,0 +1,80 @@
+# times filling the artwork store with a library's thumbnails, as a sync does before writing the .nfo files
+# - fetches every thumbnail of a channel from benchmarks/server.py, one at a time and then on the upload pool,
+#   each into an empty store
+# - then times a sync that finds every thumbnail stored, and looking up the stored copy for each .nfo
+# - with --size below what the thumbnails take, reports how many images the store kept
+#
+# usage: python benchmarks/bench_artwork.py [--uploads 500] [--latency 50] [--size 500] [--set thread_count=20]
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCHMARKS), BENCHMARKS]
+
+from resources.lib.Engine import Config, Engine  # noqa: E402
+from server import Channels, StandIn  # noqa: E402
+
+
+def fill(server, urls, settings):
+    # returns (seconds to store urls in an empty store, seconds to find them all stored, seconds to look them all up,
+    # images kept, MB kept, requests made)
+    profile = tempfile.mkdtemp(prefix='yourtube-artwork-')
+    engine = Engine(Config(profile, lambda key: settings.get(key, ''), youtube_url=server.url,
+                           log=lambda message, level: None))
+    try:
+        before = server.requests
+        start = time.time()
+        engine.fetch_artwork(urls)
+        cold = time.time() - start
+        requests = server.requests - before
+        start = time.time()
+        engine.fetch_artwork(urls)
+        warm = time.time() - start
+        store = engine.artwork_store()
+        start = time.time()
+        kept = sum(1 for n, url in enumerate(urls)
+                   if engine.nfo_artwork({'video_id': str(n), 'thumb': url})['thumb'] != url)
+        store.commit()
+        lookup = time.time() - start
+        size = sum(os.path.getsize(os.path.join(folder, name))
+                   for folder, folders, names in os.walk(store.root) for name in names if name != 'index.db')
+        return cold, warm, lookup, kept, size / 1048576.0, requests
+    finally:
+        engine.close()
+        shutil.rmtree(profile, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="time filling the artwork store with a library's thumbnails")
+    parser.add_argument('--uploads', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=50, help="milliseconds added to every response")
+    parser.add_argument('--size', type=float, default=500, help="MB the store may hold")
+    parser.add_argument('--set', action='append', default=[], metavar='SETTING=VALUE', help="engine setting")
+    options = parser.parse_args(argv)
+
+    channels = Channels(1, options.uploads)
+    server = StandIn(channels, latency=options.latency / 1000.0).start()
+    urls = [server.url + '/vi/' + video_id + '/hqdefault.jpg' for video_id in channels.video_ids(channels.ids[0])]
+    settings = {'request_rate': '0', 'artwork': 'true', 'artwork_size': str(options.size)}
+    settings.update(setting.split('=', 1) for setting in options.set)
+    try:
+        print("%d thumbnails, %.0fms latency, %.0f MB store" % (len(urls), options.latency, options.size))
+        print("%-14s %9s %9s %9s %10s %9s %9s" % ('', 'fetch s', 'stored s', 'lookup ms', 'requests', 'kept',
+                                                  'MB kept'))
+        for name, threads in (('one at a time', '1'), ('upload pool', settings.get('thread_count', '10'))):
+            cold, warm, lookup, kept, size, requests = fill(server, urls, dict(settings, thread_count=threads))
+            print("%-14s %9.2f %9.3f %9.1f %10d %9d %9.1f" % (name, cold, warm, lookup * 1000, requests, kept, size))
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
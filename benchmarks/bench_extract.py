@@ -0,0 +1,117 @@
+# compares resources.lib.Extract against the BeautifulSoup code it replaced
+# - checks both produce the same fields from the saved pages in benchmarks/fixtures
+# - the rss feed, never read with BeautifulSoup, is checked against a full ElementTree parse
+# - reports the time each takes per page
+#
+# usage: python benchmarks/bench_extract.py [repeat]
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from resources.lib.Extract import (extract_about, extract_feed, extract_playlist, extract_videos,  # noqa: E402
+                                   extract_watch)
+
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+
+
+def soup_watch(html):
+    # the watch page fields as fetch_upload_about() used to read them
+    from bs4 import BeautifulSoup
+    page = BeautifulSoup(html, "html.parser")
+    plot = str()
+    for line in page.find("p", id="eow-description").strings:
+        plot += line + '\n'
+    return {
+        'aired': page.find("meta", attrs={"itemprop": "datePublished"})['content'],
+        'title': page.find("meta", attrs={"itemprop": "name"})['content'],
+        'duration': page.find("meta", attrs={"itemprop": "duration"})['content'],
+        'plot': plot
+    }
+
+
+def soup_about(html):
+    # the about page fields as fetch_channel_about() used to read them, and the banner it left as a TODO
+    from bs4 import BeautifulSoup
+    page = BeautifulSoup(html, "html.parser")
+    banner = page.find("div", id="gh-banner").style.string.split("url(")[1].split(")")[0]
+    return {
+        'thumb': page.find("img", class_="channel-header-profile-image")['src'],
+        'banner': 'https:' + banner,
+        'plot': page.find("pre").text,
+        'joined': page.find_all("span", class_="about-stat")[2].text.split(" ", 1)[1]
+    }
+
+
+def soup_duration(tag, prefix='Duration:'):
+    # the duration in the text of tag, after prefix and before the full stop ending a sentence, or None
+    return tag.text.split(prefix)[-1].strip().rstrip('.') if tag else None
+
+
+def soup_playlist(html):
+    # the playlist fields as fetch_channel_uploads() used to read them, and the duration of each item
+    from bs4 import BeautifulSoup
+    page = BeautifulSoup(html, "html.parser")
+    length = int(page.find("span", id="playlist-length").text.split(" ")[0].replace(',', ''))
+    items = [{'index': li.span.text.strip(), 'video_id': li['data-video-id'], 'title': li['data-video-title'],
+              'duration': soup_duration(li.find("span", class_="video-time"))}
+             for li in page.find_all("li", class_="yt-uix-scroller-scroll-unit")]
+    return length, items
+
+
+def soup_videos(html):
+    # the channel videos page fields as fetch_channel_uploads() used to read them, and the duration of each video
+    # - matching on the class token, current bs4 finds nothing for the old class_="yt-lockup-title "
+    from bs4 import BeautifulSoup
+    page = BeautifulSoup(html, "html.parser")
+    return [{'title': h3.a['title'], 'video_id': h3.a['href'].split('=')[1],
+             'duration': soup_duration(h3.find("span", class_="accessible-description"))}
+            for h3 in page.find_all("h3", class_="yt-lockup-title")]
+
+
+def etree_feed(xml):
+    # the feed fields read from a parsed document
+    import xml.etree.ElementTree as ET
+    ns = {'atom': 'http://www.w3.org/2005/Atom', 'yt': 'http://www.youtube.com/xml/schemas/2015',
+          'media': 'http://search.yahoo.com/mrss/'}
+    feed = ET.fromstring(xml.encode('utf-8'))
+    return [{'video_id': entry.find('yt:videoId', ns).text,
+             'title': entry.find('atom:title', ns).text,
+             'aired': entry.find('atom:published', ns).text[:10],
+             'plot': ''.join(line + '\n' for line in (entry.find('media:group/media:description', ns).text or '')
+                             .split('\n') if line)}
+            for entry in feed.findall('atom:entry', ns)]
+
+
+CASES = [
+    ('watch.html', soup_watch, extract_watch),
+    ('playlist.html', soup_playlist, extract_playlist),
+    ('videos.html', soup_videos, extract_videos),
+    ('feed.xml', etree_feed, extract_feed),
+    ('about.html', soup_about, extract_about),
+]
+
+
+def main(repeat=20):
+    failed = False
+    print("%-15s %12s %12s %9s  %s" % ('page', 'soup ms', 'extract ms', 'speedup', 'output'))
+    for name, soup, extract in CASES:
+        with io.open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+            html = f.read()
+        same = soup(html) == extract(html)
+        failed = failed or not same
+        soup_ms = min(timeit.repeat(lambda: soup(html), number=1, repeat=max(1, repeat // 4))) * 1000
+        extract_ms = min(timeit.repeat(lambda: extract(html), number=1, repeat=repeat)) * 1000
+        print("%-15s %12.2f %12.2f %8.1fx  %s"
+              % (name, soup_ms, extract_ms, soup_ms / extract_ms, 'same' if same else 'DIFFERENT'))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(a) for a in sys.argv[1:2]]))
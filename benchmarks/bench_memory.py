@@ -0,0 +1,116 @@
+# peak memory of syncing a channel with a long history, as it matters on a low-memory box like a raspberry pi
+# - "records" compares a channel's worth of Upload records with the dictionaries they replaced,
+#   both as listed (video_id and title) and as fetched (every field of the .nfo)
+# - "sync" is a full sync() of a single channel into an empty library against benchmarks/server.py
+# - reports the peak of python's own allocations (tracemalloc, python 3 only) and the peak RSS of the process
+#
+# usage: python benchmarks/bench_memory.py [--uploads 10000] [--set thread_count=20]
+
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCHMARKS), BENCHMARKS]
+
+from bench_sync import peak_rss_mb  # noqa: E402
+from resources.lib.Engine import Config, Engine  # noqa: E402
+from resources.lib.Upload import Upload  # noqa: E402
+from server import Channels, StandIn  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def traced(func):
+    # returns (result of func, peak bytes python allocated while it ran and still held or freed since)
+    if tracemalloc is None:
+        return func(), None
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def megabytes(size):
+    return '%8.1f MB' % (size / 1048576.0) if size is not None else '       -'
+
+
+def records(count):
+    # bytes per upload of each shape, over the same strings
+    ids = ['UCbench%017d' % n for n in range(count)]
+    titles = [u'Upload number %d of a long channel' % n for n in range(count)]
+    plot = u'A description of a few lines.\n' * 20
+
+    def listed_dicts():
+        return [{'title': t, 'video_id': v, 'thumb': "https://i.ytimg.com/vi/" + v + "/hqdefault.jpg"}
+                for v, t in zip(ids, titles)]
+
+    def listed_records():
+        return [Upload(v, title=t) for v, t in zip(ids, titles)]
+
+    def fetched_dicts():
+        return [{'video_id': v, 'thumb': "https://i.ytimg.com/vi/" + v + "/hqdefault.jpg", 'aired': '2015-01-01',
+                 'title': t, 'plot': plot, 'runtime': '12', 'season': '01', 'episode': str(n + 1).zfill(2)}
+                for n, (v, t) in enumerate(zip(ids, titles))]
+
+    def fetched_records():
+        return [Upload(v, aired='2015-01-01', title=t, plot=plot, runtime='12', season='01',
+                       episode=str(n + 1).zfill(2)) for n, (v, t) in enumerate(zip(ids, titles))]
+
+    rows = []
+    for name, func in (('listed as dicts', listed_dicts), ('listed as Upload', listed_records),
+                       ('fetched as dicts', fetched_dicts), ('fetched as Upload', fetched_records)):
+        rows.append((name, traced(func)[1]))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="peak memory of syncing a channel with a long history")
+    parser.add_argument('--uploads', type=int, default=10000)
+    parser.add_argument('--set', action='append', default=[], metavar='SETTING=VALUE', help="engine setting")
+    options = parser.parse_args(argv)
+
+    if tracemalloc is None:
+        print("python %d.%d has no tracemalloc, only peak RSS is reported" % sys.version_info[:2])
+    print("%-24s %11s %13s" % ('', 'peak', 'per upload'))
+    for name, size in records(options.uploads):
+        print("%-24s %s %10s" % (name, megabytes(size),
+                                 '%.0f B' % (float(size) / options.uploads) if size is not None else '-'))
+
+    channels = Channels(1, options.uploads)
+    server = StandIn(channels).start()
+    profile = tempfile.mkdtemp(prefix='yourtube-memory-')
+    with io.open(os.path.join(profile, 'subscriptions.rss'), 'w', encoding='utf-8') as f:
+        f.write(channels.opml())
+    settings = {'request_rate': '0'}
+    settings.update(setting.split('=', 1) for setting in options.set)
+    engine = Engine(Config(profile, lambda key: settings.get(key, ''), youtube_url=server.url,
+                           log=lambda message, level: None))
+    try:
+        start = time.time()
+        summary, peak = traced(engine.sync)
+        seconds = time.time() - start
+        episodes = len(os.listdir(os.path.join(profile, 'TV', channels.title(channels.ids[0])))) // 2
+    finally:
+        engine.close()
+        server.stop()
+        shutil.rmtree(profile, ignore_errors=True)
+    print("%-24s %s %10s   %d episodes in %.1fs, peak RSS %.1f MB"
+          % ('sync', megabytes(peak), '%.0f B' % (float(peak) / options.uploads) if peak is not None else '-',
+             episodes, seconds, peak_rss_mb()))
+    return 0 if summary['synced'] == 1 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# times routing a large synthetic set of uploads into shows with resources.lib.Rules
+# - "walk" evaluates each show's ruleTree recursively for every video, the obvious way to do it
+# - "compiled" calls each show's compile_rules() function for every video
+# - "router" routes each channel's uploads in bulk with Router.route(), as sync does
+# - checks all three put every video in the same show
+#
+# usage: python benchmarks/bench_rules.py [--channels 500] [--uploads 100] [--shows 40] [--repeat 3]
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from resources.lib.Rules import FIELDS, Router, compile_rules, rules_from_string  # noqa: E402
+
+WORDS = ['numbers', 'prime', 'puzzle', 'live', 'podcast', 'episode', 'part', 'review', 'shorts', 'interview',
+         'maths', 'physics', 'chess', 'stream', 'highlights', 'trailer', 'q&a', 'behind', 'scenes', 'update']
+
+
+def walk(node, upload):
+    # the recursive evaluation the compiler replaces
+    op = node.cargo
+    if op == 'AND':
+        return walk(node.left, upload) and walk(node.right, upload)
+    if op == 'OR':
+        return walk(node.left, upload) or walk(node.right, upload)
+    value = upload.get(FIELDS[node.left.cargo]) or u''
+    if op == 'IS':
+        return value == node.right.cargo
+    if op == 'IS NOT':
+        return value != node.right.cargo
+    if op == 'CONTAINS':
+        return node.right.cargo.lower() in value.lower()
+    if op == 'DOES NOT CONTAIN':
+        return node.right.cargo.lower() not in value.lower()
+    if op == 'MATCHES':
+        return re.search(node.right.cargo, value) is not None
+    return re.search(node.right.cargo, value) is None
+
+
+def make_uploads(channels, uploads, rng):
+    # returns {channel_id: [upload info]} of titles and descriptions made of random words
+    library = {}
+    for c in range(channels):
+        channel_id = 'UCbench%017d' % c
+        library[channel_id] = [{
+            'video_id': '%s-%05d' % (channel_id[7:], n),
+            'title': u' '.join(rng.choice(WORDS) for _ in range(6)).title() + u' #%d' % n,
+            'plot': u' '.join(rng.choice(WORDS) for _ in range(60)),
+        } for n in range(uploads)]
+    return library
+
+
+def make_shows(channel_ids, count, rng):
+    # a mix of the shows people make: merged channels, channels split by title, and shows across every channel
+    shows = []
+    for n in range(count):
+        kind = n % 4
+        if kind == 0:
+            merged = rng.sample(channel_ids, 4)
+            rules = ['channel', merged[0], 'IS']
+            for channel_id in merged[1:]:
+                rules += ['channel', channel_id, 'IS', 'OR']
+            shows.append(('Merged %d' % n, rules))
+        elif kind == 1:
+            shows.append(('Split %d' % n, ['channel', rng.choice(channel_ids), 'IS',
+                                           'title', rng.choice(WORDS), 'CONTAINS', 'AND']))
+        elif kind == 2:
+            shows.append(('Parts %d' % n, ['channel', rng.choice(channel_ids), 'IS',
+                                           'title', r'(?i)\bpart \d+$', 'MATCHES',
+                                           'description', rng.choice(WORDS), 'CONTAINS', 'OR', 'AND']))
+        else:
+            shows.append(('Everywhere %d' % n, ['title', rng.choice(WORDS) + ' ' + rng.choice(WORDS), 'CONTAINS',
+                                                'description', 'trailer', 'DOES NOT CONTAIN', 'AND']))
+    return shows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="time routing uploads into shows with resources.lib.Rules")
+    parser.add_argument('--channels', type=int, default=500)
+    parser.add_argument('--uploads', type=int, default=100, help="uploads per channel")
+    parser.add_argument('--shows', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args(argv)
+
+    rng = random.Random(16)
+    library = make_uploads(options.channels, options.uploads, rng)
+    shows = make_shows(sorted(library), options.shows, rng)
+    titles = [title for title, rules in shows]
+    videos = options.channels * options.uploads
+
+    def by_walking():
+        trees = [rules_from_string(rules) for title, rules in shows]
+        routes = {}
+        for channel_id, uploads in library.items():
+            for upload in uploads:
+                record = dict(upload, channel_id=channel_id)
+                routes[upload['video_id']] = next(
+                    (titles[i] for i, tree in enumerate(trees) if walk(tree, record)), None)
+        return routes
+
+    def by_compiled():
+        matchers = [compile_rules(rules) for title, rules in shows]
+        routes = {}
+        for channel_id, uploads in library.items():
+            for upload in uploads:
+                record = dict(upload, channel_id=channel_id)
+                routes[upload['video_id']] = next(
+                    (titles[i] for i, match in enumerate(matchers) if match(record)), None)
+        return routes
+
+    def by_router():
+        router = Router(shows)
+        routes = {}
+        for channel_id, uploads in library.items():
+            for upload, title in zip(uploads, router.route(channel_id, uploads)):
+                routes[upload['video_id']] = title
+        return routes
+
+    expected = by_walking()
+    routed = sum(1 for title in expected.values() if title is not None)
+    print("%d videos in %d channels, %d shows, %d videos routed out of their channel's show"
+          % (videos, options.channels, options.shows, routed))
+    print("%-10s %10s %12s %9s  %s" % ('evaluator', 'total ms', 'us / video', 'speedup', 'routes'))
+    failed = False
+    walk_s = None
+    for name, run in (('walk', by_walking), ('compiled', by_compiled), ('router', by_router)):
+        same = run() == expected
+        failed = failed or not same
+        seconds = min(timeit.repeat(run, number=1, repeat=options.repeat))
+        walk_s = walk_s or seconds
+        print("%-10s %10.1f %12.2f %8.1fx  %s"
+              % (name, seconds * 1000, seconds * 1e6 / videos, walk_s / seconds, 'same' if same else 'DIFFERENT'))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
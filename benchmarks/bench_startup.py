@@ -0,0 +1,123 @@
+# times addon.py starting cold for each kind of view, as kodi runs it afresh for every click
+# - every run is a new python process, with kodi's modules replaced by the ones in benchmarks/stubs
+# - reports the time from the start of addon.py to the end of the view and the modules it had to import,
+#   and fails if a static menu imports networking or parsing code or a view goes over its budget
+# - views that need youtube are served from the caches a previous visit left, warmed from the stand-in first
+#
+# usage: python benchmarks/bench_startup.py [--subscriptions 500] [--repeat 5] [--budget 40]
+
+from __future__ import print_function
+
+import os
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+
+# modules a static menu must not import
+HEAVY = ['requests', 'bs4', 'sqlite3', 'xml.etree.ElementTree', 'resources.lib.Engine', 'resources.lib.Http',
+         'resources.lib.Extract', 'resources.lib.Database']
+
+
+def child(profile, query):
+    # run addon.py once for query and print what it took as json
+    # - nothing is imported before addon.py runs that the interpreter did not already have
+    import time
+
+    sys.path[:0] = [os.path.join(BENCHMARKS, 'stubs'), ROOT]
+    path = os.path.join(ROOT, 'addon.py')
+    with open(path) as f:
+        code = compile(f.read(), path, 'exec')
+    before = set(sys.modules)
+    start = time.time()
+    import xbmcaddon
+    xbmcaddon.PROFILE = profile
+    xbmcaddon.SETTINGS['request_rate'] = '0'
+    sys.argv = ['plugin://plugin.video.yourtube/', '1', query]
+    exec(code, {'__name__': '__main__', '__file__': path})
+    seconds = time.time() - start
+    imported = sorted(name for name in set(sys.modules) - before if sys.modules.get(name) is not None)
+
+    import json
+    import xbmcplugin
+    print(json.dumps({'seconds': seconds, 'modules': imported, 'items': len(xbmcplugin.ITEMS)}))
+
+
+def run(profile, query):
+    import json
+    import subprocess
+
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child', profile, query])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main(argv=None):
+    import argparse
+    import compileall
+    import io
+    import shutil
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="time addon.py starting cold for each kind of view")
+    parser.add_argument('--subscriptions', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5, help="runs of each view, the fastest is reported")
+    parser.add_argument('--budget', type=float, default=40, help="milliseconds a view may take")
+    parser.add_argument('--modules', action='store_true', help="list the modules each view imports")
+    options = parser.parse_args(argv)
+
+    # kodi keeps the compiled modules after the first click, so the runs should find them too
+    compileall.compile_dir(os.path.join(ROOT, 'resources'), quiet=1)
+    sys.path[:0] = [ROOT, BENCHMARKS]
+    from resources.lib.Engine import Config, Engine
+    from server import Channels, StandIn
+
+    channels = Channels(options.subscriptions, 100)
+    server = StandIn(channels).start()
+    profile = tempfile.mkdtemp(prefix='yourtube-startup-')
+    try:
+        with io.open(os.path.join(profile, 'subscriptions.rss'), 'w', encoding='utf-8') as f:
+            f.write(channels.opml())
+        # a visit to the views that need youtube, leaving their results cached
+        engine = Engine(Config(profile, lambda key: '0' if key == 'request_rate' else '', youtube_url=server.url,
+                               log=lambda message, level: None, interactive=True))
+        channel_id, title = channels.ids[0], channels.title(channels.ids[0])
+        engine.parse_subscriptions()
+        engine.view_channel_about(title, channel_id)
+        engine.view_uploads_page(channel_id)
+        video_id = channels.video_ids(channel_id)[0]
+        engine.view_upload_about(video_id)
+        engine.close()
+
+        views = [
+            ('root menu', '', True),
+            ('experiments menu', '?mode=experiment&foldername=root', True),
+            ('sync', '?mode=sync&foldername=root', True),
+            ('subscriptions', '?mode=experiment&foldername=parse_subscriptions', False),
+            ('channel', '?mode=channel&channel_id=%s&title=%s' % (channel_id, title.replace(' ', '+')), False),
+            ('uploads', '?mode=fetch_uploads&channel_id=%s' % channel_id, False),
+            ('video', '?mode=upload_root&video_id=%s' % video_id, False),
+        ]
+        failed = False
+        print("%d subscriptions, budget %.0fms" % (options.subscriptions, options.budget))
+        print("%-18s %9s %8s %7s  %s" % ('view', 'ms', 'modules', 'items', 'heavy modules imported'))
+        for name, query, static in views:
+            results = [run(profile, query) for _ in range(options.repeat)]
+            best = min(results, key=lambda result: result['seconds'])
+            heavy = [module for module in HEAVY if module in best['modules']]
+            over = best['seconds'] * 1000 > options.budget
+            failed = failed or over or (static and bool(heavy))
+            print("%-18s %9.1f %8d %7d  %s%s" % (name, best['seconds'] * 1000, len(best['modules']), best['items'],
+                                                 ', '.join(heavy) or '-', '  OVER BUDGET' if over else ''))
+            if options.modules:
+                print('    ' + ' '.join(best['modules']))
+        return 1 if failed else 0
+    finally:
+        server.stop()
+        shutil.rmtree(profile)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:4])
+    else:
+        sys.exit(main())
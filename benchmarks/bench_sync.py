@@ -0,0 +1,160 @@
+# offline benchmark of the sync pipeline
+# - runs the sync engine against benchmarks/server.py, a local stand-in for youtube
+# - reports wall time, requests per second, peak RSS and time spent per stage for:
+#   - a full sync() of every channel into an empty library
+#   - an incremental sync() after every channel published a few new uploads
+#   - fetch_channel_uploads() of a whole channel with force
+#   - fetch_upload_about_multithreaded() of a batch of videos with force
+#
+# usage: python benchmarks/bench_sync.py [--channels 10] [--uploads 200] [--latency 20] [--set thread_count=20]
+#        python benchmarks/bench_sync.py --limit 50 --set request_rate=80   (pacing against a throttling stand-in)
+
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCHMARKS), BENCHMARKS]
+
+from resources.lib.Engine import Config, Engine  # noqa: E402
+from server import Channels, StandIn  # noqa: E402
+
+# engine methods timed as stages, a stage's time includes the stages it calls
+STAGES = ['refresh_subscriptions', 'fetch_channel_about', 'fetch_channel_uploads', 'fetch_upload_about',
+          'sync_write_channels', 'get_page']
+
+
+class Stages:
+    def __init__(self, engine, names):
+        # replace each method in names on engine with a timed wrapper
+        self.lock = threading.Lock()
+        self.calls = dict((name, 0) for name in names)
+        self.seconds = dict((name, 0.0) for name in names)
+        for name in names:
+            setattr(engine, name, self.timed(name, getattr(engine, name)))
+
+    def timed(self, name, func):
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.calls[name] += 1
+                    self.seconds[name] += time.time() - start
+        return wrapper
+
+    def reset(self):
+        with self.lock:
+            for name in self.calls:
+                self.calls[name] = 0
+                self.seconds[name] = 0.0
+
+    def report(self):
+        with self.lock:
+            return dict((name, {'calls': self.calls[name], 'seconds': round(self.seconds[name], 4)})
+                        for name in self.calls if self.calls[name])
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def measure(name, func, server, stages):
+    # run func and return a dictionary of measurements
+    stages.reset()
+    requests, size, refused = server.requests, server.bytes, server.statuses.get(429, 0)
+    start = time.time()
+    func()
+    wall = time.time() - start
+    requests = server.requests - requests
+    return {
+        'scenario': name,
+        'wall_seconds': round(wall, 3),
+        'requests': requests,
+        'refused': server.statuses.get(429, 0) - refused,
+        'requests_per_second': round(requests / wall, 1) if wall else 0,
+        'megabytes': round((server.bytes - size) / (1024.0 * 1024.0), 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'stages': stages.report()
+    }
+
+
+def print_result(result):
+    print("%-40s %8.2fs %7d req %5d 429 %8.1f req/s %8.2f MB  peak RSS %6.1f MB"
+          % (result['scenario'], result['wall_seconds'], result['requests'], result['refused'],
+             result['requests_per_second'], result['megabytes'], result['peak_rss_mb']))
+    for name in STAGES:
+        stage = result['stages'].get(name)
+        if stage:
+            print("    %-34s %7d calls %9.3fs total %9.2fms mean"
+                  % (name, stage['calls'], stage['seconds'], 1000 * stage['seconds'] / stage['calls']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the sync pipeline against a local stand-in for youtube")
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--uploads', type=int, default=200, help="uploads per channel")
+    parser.add_argument('--new', type=int, default=5, help="new uploads per channel for the incremental sync")
+    parser.add_argument('--batch', type=int, default=100, help="videos for fetch_upload_about_multithreaded")
+    parser.add_argument('--latency', type=float, default=20, help="milliseconds added to every response")
+    parser.add_argument('--limit', type=int, help="requests per second the stand-in serves before answering 429")
+    parser.add_argument('--set', action='append', default=[], metavar='SETTING=VALUE', help="engine setting")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="show the engine's own output")
+    options = parser.parse_args()
+
+    channels = Channels(options.channels, options.uploads)
+    server = StandIn(channels, latency=options.latency / 1000.0, limit=options.limit).start()
+    profile = tempfile.mkdtemp(prefix='yourtube-bench-')
+    with io.open(os.path.join(profile, 'subscriptions.rss'), 'w', encoding='utf-8') as f:
+        f.write(channels.opml())
+    # the stand-in is not youtube, so requests are not paced unless asked for with --set request_rate=10
+    settings = {'request_rate': '0'}
+    settings.update(setting.split('=', 1) for setting in options.set)
+    config = Config(profile, lambda key: settings.get(key, ''), youtube_url=server.url)
+    if not options.verbose:
+        config.log = lambda message, level: None
+    engine = Engine(config)
+    stages = Stages(engine, STAGES)
+
+    first, second = channels.ids[:2]
+    batch = channels.video_ids(second)[:options.batch]
+    scenarios = [
+        ('sync (full, %s channels)' % options.channels, engine.sync),
+        ('sync (incremental, %s new per channel)' % options.new,
+         lambda: channels.add_uploads(options.new) or engine.sync()),
+        ('fetch_channel_uploads (force)', lambda: engine.fetch_channel_uploads(first, force=True)),
+        ('fetch_upload_about_multithreaded (%s)' % len(batch),
+         lambda: engine.fetch_upload_about_multithreaded(batch, force=True)),
+    ]
+
+    print("%s channels x %s uploads, %sms latency, settings %s"
+          % (options.channels, options.uploads, options.latency, settings or 'default'))
+    results = []
+    try:
+        for name, func in scenarios:
+            results.append(measure(name, func, server, stages))
+            print_result(results[-1])
+    finally:
+        engine.close()
+        server.stop()
+        shutil.rmtree(profile, ignore_errors=True)
+
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+# local stand-in for the youtube endpoints the addon scrapes
+# - replays the saved pages in benchmarks/fixtures, with video ids and playlist positions rewritten
+#   for a set of synthetic channels, so pagination behaves like the real site
+# - every video is the saved watch page, listed with its duration and published in each channel's rss feed
+#   with its title, date and description, as youtube would show the same video everywhere
+# - every response is delayed by a configurable latency
+# - /videos, /about and feed pages carry an ETag and answer If-None-Match with a 304
+# - /vi/VIDEO_ID/hqdefault.jpg is a thumbnail of made up bytes, as large as youtube's and different for every video
+# - with a limit, requests over that many per second are refused with a 429 and a Retry-After, as youtube does
+#
+# usage: python benchmarks/server.py [--port 8000] [--channels 10] [--uploads 200] [--latency 50] [--limit 20]
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+INDEX_MESSAGE_rx = re.compile(r'(<span class="index-message[^"]*">)[^<]*(</span>)')
+SCROLL_UNIT_rx = re.compile(r'class="yt-uix-scroller-scroll-unit [^"]*"')
+VIDEO_ID_rx = re.compile(r'data-video-id="([^"]*)"')
+CONTEXT_ID_rx = re.compile(r'data-context-item-id="([^"]*)"')
+VIDEO_ID_TAG_rx = re.compile(r'<yt:videoId>([^<]*)</yt:videoId>')
+CHANNEL_ID_TAG_rx = re.compile(r'<yt:channelId>([^<]*)</yt:channelId>')
+PLAYLIST_LENGTH_rx = re.compile(r'<span id="playlist-length">[^<]*</span>')
+PLAYLIST_INDEX_rx = re.compile(r'<span id="playlist-current-index">[^<]*</span>')
+LOCKUP_DURATION_rx = re.compile(r'(Duration: )[\d:]+')
+VIDEO_TIME_rx = re.compile(r'(class="video-time">)[\d:]+')
+FEED_ENTRIES = 15  # uploads youtube lists in a channel's feed
+DURATION = u'1:14:32'  # of the saved watch page
+THUMBNAIL_SIZE = 24 * 1024  # bytes, about the size of youtube's hqdefault.jpg
+
+
+def fixture(name):
+    with io.open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def thumbnail(video_id):
+    # the bytes of a made up jpeg for video_id
+    seed = hashlib.sha1(video_id.encode('utf-8')).digest()
+    return b'\xff\xd8' + seed * (THUMBNAIL_SIZE // len(seed)) + b'\xff\xd9'
+
+
+def split_list(html, item):
+    # splits a saved page into (head, items, tail) around its list of newline separated items,
+    # each starting with "item" and ending with "</li>"
+    start = html.index(item)
+    end = html.index('</li>', html.rindex(item)) + len('</li>')
+    return html[:start], html[start:end].split('\n'), html[end:]
+
+
+class Channels:
+    def __init__(self, channels=10, uploads=200, window=80):
+        # - channels: number of synthetic channels
+        # - uploads: number of uploads of each channel
+        # - window: number of playlist items shown after the playing one, as youtube shows a limited window
+        self.ids = ['UCbench%017d' % i for i in range(channels)]
+        self.uploads = dict((channel_id, uploads) for channel_id in self.ids)
+        self.window = window
+        self.lock = threading.Lock()
+        self.watch = fixture('watch.html')
+        self.about = fixture('about.html')
+        self.videos = split_list(fixture('videos.html'), '<li class="feed-item-container')
+        self.playlist = split_list(fixture('playlist.html'), '<li class="yt-uix-scroller-scroll-unit')
+        feed = fixture('feed.xml')
+        start, end = feed.index('<entry>'), feed.index('</entry>') + len('</entry>')
+        self.feed = (feed[:start], feed[start:end], feed[feed.rindex('</entry>') + len('</entry>'):])
+
+    def title(self, channel_id):
+        return u'Bench Channel %d' % self.ids.index(channel_id)
+
+    def video_ids(self, channel_id):
+        # all uploads of channel_id, newest first
+        with self.lock:
+            count = self.uploads[channel_id]
+        return ['%s-%05d' % (channel_id[7:], n) for n in range(count, 0, -1)]
+
+    def add_uploads(self, count):
+        # publish "count" new uploads on every channel
+        with self.lock:
+            for channel_id in self.ids:
+                self.uploads[channel_id] += count
+
+    def opml(self):
+        # the subscription_manager takeout for every channel
+        outlines = u''.join(
+            u'<outline text="%s" title="%s" type="rss" xmlUrl="https://www.youtube.com/feeds/videos.xml?channel_id=%s" />'
+            % (self.title(c), self.title(c), c) for c in self.ids)
+        return (u'<opml version="1.1"><body><outline text="YouTube Subscriptions" title="YouTube Subscriptions">'
+                + outlines + u'</outline></body></opml>')
+
+    def videos_page(self, channel_id):
+        head, items, tail = self.videos
+        page = []
+        for item, video_id in zip(items, self.video_ids(channel_id)):
+            item = item.replace(CONTEXT_ID_rx.search(item).group(1), video_id)
+            page.append(LOCKUP_DURATION_rx.sub(lambda m: m.group(1) + DURATION, item))
+        return head + u'\n'.join(page) + tail
+
+    def feed_page(self, channel_id):
+        head, entry, tail = self.feed
+        template_id = VIDEO_ID_TAG_rx.search(entry).group(1)
+        template_channel = CHANNEL_ID_TAG_rx.search(head).group(1)
+        entries = [entry.replace(template_id, video_id) for video_id in self.video_ids(channel_id)[:FEED_ENTRIES]]
+        return (head + u'\n '.join(entries) + tail).replace(template_channel, channel_id)
+
+    def playlist_page(self, channel_id, video_id):
+        head, items, tail = self.playlist
+        template = items[0]
+        template_id = VIDEO_ID_rx.search(template).group(1)
+        ids = self.video_ids(channel_id)
+        current = ids.index(video_id)
+        page = []
+        for position in range(max(0, current - 20), min(len(ids), current + self.window + 1)):
+            playing = position == current
+            item = VIDEO_TIME_rx.sub(lambda m: m.group(1) + DURATION, template.replace(template_id, ids[position]))
+            item = SCROLL_UNIT_rx.sub(
+                'class="yt-uix-scroller-scroll-unit %s"' % ('currently-playing' if playing else ''), item)
+            item = INDEX_MESSAGE_rx.sub(
+                lambda m: m.group(1) + (u'\u25b6' if playing else u'{:,}'.format(position + 1)) + m.group(2), item)
+            page.append(item)
+        head = PLAYLIST_LENGTH_rx.sub(u'<span id="playlist-length">{:,} videos</span>'.format(len(ids)), head)
+        head = PLAYLIST_INDEX_rx.sub(u'<span id="playlist-current-index">%d</span>' % (current + 1), head)
+        return head + u'\n'.join(page) + tail
+
+    def page(self, url):
+        # returns (status, body, cacheable) for a request path, body is bytes for an image
+        url = urlparse(url)
+        query = parse_qs(url.query)
+        parts = url.path.strip('/').split('/')
+        if parts[0] == 'channel' and len(parts) == 3 and parts[1] in self.uploads:
+            if parts[2] == 'videos':
+                return 200, self.videos_page(parts[1]), True
+            if parts[2] == 'about':
+                return 200, self.about, True
+        elif parts[0] == 'watch' and 'v' in query:
+            if 'list' in query:
+                channel_id = 'UC' + query['list'][0][2:]
+                if channel_id in self.uploads and query['v'][0] in self.video_ids(channel_id):
+                    return 200, self.playlist_page(channel_id, query['v'][0]), False
+            else:
+                return 200, self.watch, False
+        elif parts == ['feeds', 'videos.xml'] and query.get('channel_id', [None])[0] in self.uploads:
+            return 200, self.feed_page(query['channel_id'][0]), True
+        elif parts[0] == 'vi' and len(parts) == 3 and parts[2] == 'hqdefault.jpg':
+            return 200, thumbnail(parts[1]), True
+        elif parts[0] == 'subscription_manager':
+            return 200, self.opml(), False
+        return 404, u'<html><body>404 Not Found</body></html>', False
+
+
+class StandIn(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, channels, port=0, latency=0.0, limit=None):
+        # - channels: a Channels instance
+        # - latency: seconds every response is delayed by
+        # - limit: requests per second served before refusing them with a 429, None for no limit
+        HTTPServer.__init__(self, ('127.0.0.1', port), Handler)
+        self.channels = channels
+        self.latency = latency
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.statuses = {}
+        self.second = (0, 0)  # (second, requests served in it)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_port
+
+    def allow(self):
+        # returns True unless this request goes over the limit for the current second
+        if not self.limit:
+            return True
+        with self.lock:
+            now = int(time.time())
+            second, served = self.second if self.second[0] == now else (now, 0)
+            self.second = (second, served + 1)
+            return served < self.limit
+
+    def count(self, status, size):
+        with self.lock:
+            self.requests += 1
+            self.bytes += size
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out as separate writes, which would otherwise wait on the client's delayed ack
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.allow():
+            status, body, cacheable = self.server.channels.page(self.path)
+        else:
+            status, body, cacheable = 429, u'<html><body>429 Too Many Requests</body></html>', False
+        image = isinstance(body, bytes) and status == 200
+        body = body if isinstance(body, bytes) else body.encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(body).hexdigest() if cacheable else None
+        if etag and self.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/jpeg' if image else 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(status, len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="serve stand-in youtube pages for the benchmarks")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--channels', type=int, default=10)
+    parser.add_argument('--uploads', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0, help="milliseconds added to every response")
+    parser.add_argument('--limit', type=int, help="requests per second served before answering 429")
+    options = parser.parse_args()
+    server = StandIn(Channels(options.channels, options.uploads), options.port, options.latency / 1000.0,
+                     options.limit)
+    print("serving %s channels at %s" % (options.channels, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
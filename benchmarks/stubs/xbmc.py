@@ -0,0 +1,45 @@
+# stand-in for kodi's xbmc module, enough to import and run the addon outside of kodi
+
+LOGDEBUG, LOGINFO, LOGNOTICE, LOGWARNING, LOGERROR, LOGSEVERE, LOGFATAL, LOGNONE = range(8)
+
+LOG = []  # (level, message) of every xbmc.log() call
+
+
+def log(msg, level=LOGDEBUG):
+    LOG.append((level, msg))
+
+
+def translatePath(path):
+    return path
+
+
+def executebuiltin(function, wait=False):
+    log("executebuiltin: %s" % function)
+
+
+def sleep(time):
+    pass
+
+
+def getGlobalIdleTime():
+    return IDLE
+
+
+IDLE = 3600  # seconds getGlobalIdleTime() reports
+PLAYING = False  # what Player().isPlaying() reports
+
+
+class Monitor(object):
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=None):
+        return False
+
+
+class Player(object):
+    def isPlaying(self):
+        return PLAYING
+
+    def play(self, item=None, listitem=None, windowed=False, startpos=-1):
+        log("play: %s" % item)
@@ -0,0 +1,25 @@
+# stand-in for kodi's xbmcaddon module
+# - settings are read from SETTINGS and the profile folder is PROFILE, both set by the benchmarks
+
+import os
+
+PROFILE = ''
+SETTINGS = {}
+
+
+class Addon(object):
+    def __init__(self, id=None):
+        self.id = id
+
+    def getAddonInfo(self, id):
+        if id == 'profile':
+            return PROFILE
+        if id == 'path':
+            return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return self.id if id == 'id' else ''
+
+    def getSetting(self, id):
+        return SETTINGS.get(id, '')
+
+    def setSetting(self, id, value):
+        SETTINGS[id] = value
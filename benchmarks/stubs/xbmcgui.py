@@ -0,0 +1,53 @@
+# stand-in for kodi's xbmcgui module
+
+
+class ListItem(object):
+    def __init__(self, label='', label2='', iconImage='', thumbnailImage='', path=''):
+        self.label = label
+        self.info = {}
+        self.art = {}
+        self.properties = {}
+
+    def setInfo(self, type, infoLabels):
+        self.info.update(infoLabels)
+
+    def setArt(self, values):
+        self.art.update(values)
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+
+class Window(object):
+    PROPERTIES = {}  # shared by every window id, enough for the home window properties the addon uses
+
+    def __init__(self, id=-1):
+        self.id = id
+
+    def getProperty(self, key):
+        return Window.PROPERTIES.get(key, '')
+
+    def setProperty(self, key, value):
+        Window.PROPERTIES[key] = value
+
+    def clearProperty(self, key):
+        Window.PROPERTIES.pop(key, None)
+
+
+class DialogProgressBG(object):
+    def create(self, heading, message=''):
+        pass
+
+    def update(self, percent=0, heading=None, message=None):
+        pass
+
+    def isFinished(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class Dialog(object):
+    def notification(self, heading, message, icon='', time=5000, sound=True):
+        pass
@@ -0,0 +1,22 @@
+# stand-in for kodi's xbmcplugin module
+# - every listed item is kept in ITEMS as (url, listitem, isFolder)
+
+ITEMS = []
+
+
+def setContent(handle, content):
+    pass
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    ITEMS.append((url, listitem, isFolder))
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    ITEMS.extend(items)
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    pass
@@ -0,0 +1,159 @@
+# local store of the artwork the library's .nfo files point kodi at: channel avatars and banners,
+# and episode thumbnails
+# - sync fetches the images ahead of time, several at once, so browsing the library never waits on youtube
+# - content-addressed: each image is kept once, as "<sha1 of its bytes>.<ext>" in a folder named after the first
+#   two digits of the hash, however many urls give the same image
+# - an index in "index.db" maps each url to its image, and records which image each .nfo written points to
+# - an image a .nfo points to is never evicted, as kodi would be left with a missing file,
+#   of the rest the least recently used are evicted once the store holds more than "max_bytes",
+#   and once the images .nfo files point to fill the store no more are kept, their .nfo files point at youtube
+# - a url is only ever fetched once while its image is kept, youtube gives changed artwork a new url
+# - the bytes held, in all and by images .nfo files point to, are counted as the store is opened and kept up to date
+#   from then on, so deciding whether there is room never sums the index, a sync is the only writer of the store
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# file extension by content type, anything else is stored as a jpeg, which youtube's thumbnails are
+EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif'}
+
+
+class ArtworkStore:
+    def __init__(self, root, max_bytes=500 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        with self.lock:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha1 TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS urls_sha1 ON urls (sha1)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS images (sha1 TEXT PRIMARY KEY, name TEXT, size INTEGER, used REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS images_used ON images (used)")
+            # image each .nfo points to, by e.g. "<video_id>/thumb"
+            self.conn.execute("CREATE TABLE IF NOT EXISTS refs (ref TEXT PRIMARY KEY, sha1 TEXT)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS refs_sha1 ON refs (sha1)")
+            self.conn.commit()
+            self.total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+            # bytes of the images .nfo files point to
+            self.referenced = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM images WHERE sha1 IN (SELECT sha1 FROM refs)").fetchone()[0]
+
+    def path(self, name):
+        return os.path.join(self.root, name[:2], name)
+
+    def missing(self, urls):
+        # returns those of urls that have no image stored, each once and in order
+        seen = set()
+        missing = []
+        with self.lock:
+            for url in urls:
+                if url in seen:
+                    continue
+                seen.add(url)
+                if self.conn.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone() is None:
+                    missing.append(url)
+        return missing
+
+    def full(self):
+        # returns True if the images .nfo files point to leave no room for another
+        return self.referenced >= self.max_bytes
+
+    def local(self, url, ref):
+        # returns the path of the image stored for url, or None, as a .nfo is written with it
+        # - ref: names the image in the .nfo, e.g. "<video_id>/thumb", the image it names is kept from then on,
+        #   and whatever it named before may be evicted
+        # - saved by the next put() or commit()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT images.sha1, images.name, images.size FROM urls JOIN images ON urls.sha1 = images.sha1 "
+                "WHERE url = ?", (url,)).fetchone()
+            old = self.conn.execute("SELECT sha1 FROM refs WHERE ref = ?", (ref,)).fetchone()
+            if row is None:
+                if old is not None:
+                    self.conn.execute("DELETE FROM refs WHERE ref = ?", (ref,))
+                    self.release(old[0])
+                return None
+            self.conn.execute("UPDATE images SET used = ? WHERE sha1 = ?", (time.time(), row[0]))
+            if old is None or old[0] != row[0]:
+                if not self.pointed_to(row[0]):
+                    self.referenced += row[2]
+                self.conn.execute("INSERT OR REPLACE INTO refs VALUES (?, ?)", (ref, row[0]))
+                if old is not None:
+                    self.release(old[0])
+        return self.path(row[1])
+
+    def pointed_to(self, sha1):
+        # returns True if a .nfo points to the image sha1, called with the lock held
+        return self.conn.execute("SELECT 1 FROM refs WHERE sha1 = ? LIMIT 1", (sha1,)).fetchone() is not None
+
+    def release(self, sha1):
+        # no longer count the image sha1 as pointed to if the last .nfo pointing to it was just rewritten,
+        # called with the lock held
+        if not self.pointed_to(sha1):
+            row = self.conn.execute("SELECT size FROM images WHERE sha1 = ?", (sha1,)).fetchone()
+            if row is not None:
+                self.referenced -= row[0]
+
+    def put(self, url, content, content_type=''):
+        # store content, the bytes of the image at url, and return its path, or None if there is no room for it
+        # - the file is written before the index lists it, so the index never names a file that is not there
+        sha1 = hashlib.sha1(content).hexdigest()
+        name = sha1 + EXTENSIONS.get(content_type.split(';')[0].strip().lower(), '.jpg')
+        path = self.path(name)
+        if not os.path.exists(path):
+            if not os.path.isdir(os.path.dirname(path)):
+                try:
+                    os.makedirs(os.path.dirname(path))
+                except OSError:
+                    if not os.path.isdir(os.path.dirname(path)):
+                        raise
+            # a temporary file of the thread's own, as two urls may give the same image at the same time
+            tmp = '%s.%s.tmp' % (path, threading.current_thread().ident)
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # windows will not rename over the copy another thread stored first
+                os.remove(tmp)
+        with self.lock:
+            if self.conn.execute("INSERT OR IGNORE INTO images VALUES (?, ?, ?, ?)",
+                                 (sha1, name, len(content), 0)).rowcount:
+                self.total += len(content)
+            self.conn.execute("UPDATE images SET used = ? WHERE sha1 = ?", (time.time(), sha1))
+            self.conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, sha1))
+            self.evict()
+            self.conn.commit()
+            kept = self.conn.execute("SELECT 1 FROM images WHERE sha1 = ?", (sha1,)).fetchone() is not None
+        return path if kept else None
+
+    def evict(self):
+        # drop the least recently used images no .nfo points to until the rest fit in max_bytes,
+        # called with the lock held
+        # - an evicted image is fetched again the next time a sync writes a .nfo with its url
+        if self.total <= self.max_bytes:
+            return
+        evicted = []
+        for sha1, name, size in self.conn.execute(
+                "SELECT sha1, name, size FROM images WHERE sha1 NOT IN (SELECT sha1 FROM refs) ORDER BY used"):
+            if self.total <= self.max_bytes:
+                break
+            evicted.append((sha1, name))
+            self.total -= size
+        for sha1, name in evicted:
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+        self.conn.executemany("DELETE FROM urls WHERE sha1 = ?", [(sha1,) for sha1, name in evicted])
+        self.conn.executemany("DELETE FROM images WHERE sha1 = ?", [(sha1,) for sha1, name in evicted])
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
@@ -0,0 +1,87 @@
+# headless entry point to the sync engine, for cron jobs or building the library on another machine
+# - settings are read from the settings.xml kodi keeps in the data folder, if there is one,
+#   and can be overridden with --set
+# - listings are printed as one json object per line, progress goes to stderr
+# - point --data at a folder kodi can read (or at the addon's own profile) and kodi only has to scan the result
+#
+# usage, from the addon's folder:
+#   python -m resources.lib.Cli --data ~/yourtube sync [--force]
+#   python -m resources.lib.Cli --data ~/yourtube subscriptions
+#   python -m resources.lib.Cli --data ~/yourtube uploads CHANNEL_ID
+#   python -m resources.lib.Cli --data ~/yourtube video VIDEO_ID
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import sys
+
+from resources.lib.Engine import Config, Engine, log
+
+
+def read_settings(path):
+    # returns a dictionary of the settings kodi saved for the addon
+    # - kodi writes <setting id="x" value="y" /> before v18 and <setting id="x">y</setting> since
+    import xml.etree.ElementTree as ET
+
+    settings = {}
+    for setting in ET.parse(path).getroot().iter('setting'):
+        value = setting.get('value')
+        settings[setting.get('id')] = value if value is not None else (setting.text or '')
+    return settings
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='yourtube', description="sync youtube subscriptions into a kodi library")
+    parser.add_argument('--data', required=True,
+                        help="folder for the library, the metadata store and subscriptions.rss / userpass.txt")
+    parser.add_argument('--set', action='append', default=[], metavar='SETTING=VALUE',
+                        help="addon setting, overrides the one in the data folder's settings.xml")
+    parser.add_argument('--youtube-url', default="https://www.youtube.com", help=argparse.SUPPRESS)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    sync = commands.add_parser('sync', help="sync every subscription into the library")
+    sync.add_argument('--force', action='store_true', help="check every channel and re-scrape every video")
+    commands.add_parser('subscriptions', help="refresh and list subscriptions")
+    uploads = commands.add_parser('uploads', help="list the uploads of a channel")
+    uploads.add_argument('channel_id')
+    video = commands.add_parser('video', help="show the info of a video")
+    video.add_argument('video_id')
+    video.add_argument('--force', action='store_true', help="scrape it even if it is in the metadata store")
+    options = parser.parse_args(argv)
+    for setting in options.set:
+        if '=' not in setting or not setting.split('=', 1)[0]:
+            parser.error("--set takes SETTING=VALUE, not %r" % setting)
+    return options
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    data = os.path.abspath(os.path.expanduser(options.data))
+    settings = {}
+    if os.path.isfile(os.path.join(data, 'settings.xml')):
+        settings = read_settings(os.path.join(data, 'settings.xml'))
+    settings.update(setting.split('=', 1) for setting in options.set)
+    engine = Engine(Config(data, lambda key: settings.get(key, ''), youtube_url=options.youtube_url,
+                           log=lambda message, level: log(message, level, sys.stderr)))
+
+    try:
+        if options.command == 'sync':
+            return 0 if engine.sync(force=options.force)['failed'] == 0 else 1
+        elif options.command == 'subscriptions':
+            for sub in engine.parse_subscriptions():
+                print(json.dumps({'channel_id': sub['channel_id'], 'title': sub['title']}))
+        elif options.command == 'uploads':
+            for upload in engine.fetch_channel_uploads(options.channel_id, force=True):
+                print(json.dumps(dict(upload), sort_keys=True))
+        elif options.command == 'video':
+            print(json.dumps(dict(engine.fetch_upload_about(options.video_id, force=options.force)), sort_keys=True))
+    finally:
+        engine.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
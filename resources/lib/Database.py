@@ -0,0 +1,318 @@
+# local metadata store for channels and their uploads
+# - replaces scanning the TV folder for .strm files to find the last seen video / episode
+# - every known upload is kept so its watch page never has to be scraped twice
+
+import sqlite3
+import threading
+import time
+
+from resources.lib.Upload import Upload
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id TEXT PRIMARY KEY,
+    title TEXT,
+    last_seen_id TEXT,
+    last_episode INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    video_id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    season TEXT,
+    episode TEXT,
+    title TEXT,
+    aired TEXT,
+    runtime TEXT,
+    plot TEXT,
+    thumb TEXT
+);
+CREATE INDEX IF NOT EXISTS uploads_channel ON uploads (channel_id);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    channel_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    position INTEGER,
+    added REAL,
+    removed REAL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    sha1 TEXT NOT NULL,
+    PRIMARY KEY (folder, name)
+);
+CREATE TABLE IF NOT EXISTS failures (
+    video_id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS backfills (
+    channel_id TEXT PRIMARY KEY,
+    force INTEGER NOT NULL,
+    last_seen_id TEXT,
+    cursor TEXT,
+    position INTEGER,
+    length INTEGER,
+    done INTEGER NOT NULL DEFAULT 0,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS backfill_uploads (
+    channel_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    video_id TEXT NOT NULL,
+    title TEXT,
+    PRIMARY KEY (channel_id, position)
+);
+"""
+
+# columns added after a table was first created, as (table, column, declaration)
+COLUMNS = [
+    ('channels', 'checked', 'REAL'),
+    ('uploads', 'folder', 'TEXT'),  # show folder the upload was written to, NULL if written before it was added
+    ('backfill_uploads', 'runtime', 'TEXT'),  # as the listing showed it, NULL if it did not
+]
+
+UPLOAD_FIELDS = ('video_id', 'season', 'episode', 'title', 'aired', 'runtime', 'plot', 'thumb')
+
+
+class Database:
+    def __init__(self, path):
+        # a single connection shared by all threads, serialized by self.lock
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.executescript(SCHEMA)
+            for table, column, declaration in COLUMNS:
+                if column not in [row[1] for row in self.conn.execute("PRAGMA table_info(%s)" % table)]:
+                    self.conn.execute("ALTER TABLE %s ADD COLUMN %s %s" % (table, column, declaration))
+            self.conn.execute("CREATE INDEX IF NOT EXISTS uploads_folder ON uploads (folder)")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def get_channel(self, channel_id):
+        # returns a dictionary of channel state or None if the channel was never synced
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM channels WHERE channel_id = ?", (channel_id,)).fetchone()
+        return dict(row) if row else None
+
+    def add_channel(self, channel_id, title, last_seen_id=None, last_episode=0):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO channels (channel_id, title, last_seen_id, last_episode) VALUES (?, ?, ?, ?)",
+                (channel_id, title, last_seen_id, last_episode))
+            self.conn.commit()
+
+    def set_checked(self, channel_id):
+        # remember when the uploads of channel_id were last listed
+        with self.lock:
+            self.conn.execute("UPDATE channels SET checked = ? WHERE channel_id = ?", (time.time(), channel_id))
+            self.conn.commit()
+
+    def get_upload(self, video_id):
+        # returns an Upload record in the same shape fetch_upload_about() produces
+        # - the stored thumb is not read back, an Upload derives it from the video_id
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM uploads WHERE video_id = ?", (video_id,)).fetchone()
+        if not row:
+            return None
+        return Upload(**dict((k, row[k]) for k in UPLOAD_FIELDS if k != 'thumb' and row[k] is not None))
+
+    def select_in(self, query, values):
+        # returns the rows of query, whose "%s" is filled with placeholders for a list of values, e.g. "IN (%s)"
+        # - runs in chunks to stay below sqlite's default limit of 999 bound parameters
+        values = list(values)
+        rows = []
+        with self.lock:
+            for i in range(0, len(values), 500):
+                chunk = values[i:i + 500]
+                rows.extend(self.conn.execute(query % ','.join('?' * len(chunk)), chunk))
+        return rows
+
+    def known_episodes(self, video_ids):
+        # returns a dictionary of video_id -> (episode, show folder) for the video_ids already in the store
+        return dict((row[0], (row[1], row[2])) for row in self.select_in(
+            "SELECT video_id, episode, folder FROM uploads WHERE video_id IN (%s)", video_ids))
+
+    def video_channels(self, video_ids):
+        # returns a dictionary of video_id -> the channel_id it was synced for, for the video_ids already in the store
+        return dict((row[0], row[1]) for row in self.select_in(
+            "SELECT video_id, channel_id FROM uploads WHERE video_id IN (%s)", video_ids))
+
+    def folder_last_episode(self, folder):
+        # returns the highest episode number of the uploads written to a show folder, from any channel, as an int
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(CAST(episode AS INTEGER)) FROM uploads WHERE folder = ?", (folder,)).fetchone()
+        return row[0] or 0
+
+    def channels(self):
+        # returns a list of dictionaries of the state of every channel ever synced
+        with self.lock:
+            return [dict(row) for row in self.conn.execute("SELECT * FROM channels")]
+
+    def add_uploads(self, channel_id, uploads, folder=None, routed=None, last_seen_id=None):
+        # store a list of Upload records, ordered oldest -> newest, in a single transaction
+        # - folder: the channel's own show folder the uploads were written to
+        # - routed: dictionary of video_id -> show folder for the uploads a rule wrote to another show instead
+        # - last_seen_id: the newest video the channel's listing showed, the channel's last seen video is advanced
+        #   to it, and left as it is if None, uploads that were only retried never move it
+        # - the channel's last episode is advanced to the newest one written to its own show
+        if not uploads and last_seen_id is None:
+            return
+        routed = routed or {}
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO uploads (channel_id, folder, %s) VALUES (?, ?, %s)"
+                % (', '.join(UPLOAD_FIELDS), ', '.join('?' * len(UPLOAD_FIELDS))),
+                ([channel_id, routed.get(u['video_id'], folder)] + [u.get(k) for k in UPLOAD_FIELDS]
+                 for u in uploads))
+            last_episode = max([int(u['episode']) for u in uploads
+                                if u.get('episode') and u['video_id'] not in routed] or [0])
+            self.conn.execute(
+                "UPDATE channels SET last_seen_id = COALESCE(?, last_seen_id), last_episode = MAX(last_episode, ?) "
+                "WHERE channel_id = ?", (last_seen_id, last_episode, channel_id))
+            self.conn.executemany("DELETE FROM failures WHERE video_id = ?", ((u['video_id'],) for u in uploads))
+            self.conn.commit()
+
+    def record_failure(self, channel_id, video_id, error, count=1):
+        # count another sync in which video_id could not be fetched, so later syncs try it again
+        # - count: 0 to have it tried again without holding it against the video, e.g. when it was never requested
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO failures (video_id, channel_id) VALUES (?, ?)", (video_id, channel_id))
+            self.conn.execute(
+                "UPDATE failures SET failures = failures + ?, error = ? WHERE video_id = ?", (count, error, video_id))
+            self.conn.commit()
+
+    def failures(self, channel_id):
+        # returns a list of (video_id, failure count) for channel_id, oldest failure first
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT video_id, failures FROM failures WHERE channel_id = ? ORDER BY rowid", (channel_id,))
+            return [(row[0], row[1]) for row in rows]
+
+    def get_backfill(self, channel_id):
+        # returns the checkpoint of an unfinished listing of channel_id's uploads, or None
+        # - a dictionary of 'force', 'last_seen_id', 'cursor', 'index', 'length', 'done'
+        #   and 'uploads', the Upload records of 'video_id', 'title' and 'runtime' listed so far, newest first
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM backfills WHERE channel_id = ?", (channel_id,)).fetchone()
+            if row is None:
+                return None
+            rows = self.conn.execute(
+                "SELECT video_id, title, runtime FROM backfill_uploads WHERE channel_id = ? ORDER BY position",
+                (channel_id,))
+            uploads = [Upload(r[0], title=r[1], runtime=r[2]) for r in rows]
+        return {'force': bool(row['force']), 'last_seen_id': row['last_seen_id'], 'cursor': row['cursor'],
+                'index': row['position'], 'length': row['length'], 'done': bool(row['done']), 'uploads': uploads}
+
+    def checkpoint_backfill(self, channel_id, state, uploads):
+        # record the listing of channel_id's uploads after another page, in a single transaction
+        # - state: dictionary of 'force', 'last_seen_id', 'cursor', 'index', 'length' and 'done'
+        # - uploads: the uploads that page added, appended to those listed before
+        with self.lock:
+            count = self.conn.execute(
+                "SELECT COUNT(*) FROM backfill_uploads WHERE channel_id = ?", (channel_id,)).fetchone()[0]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO backfill_uploads (channel_id, position, video_id, title, runtime) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(channel_id, count + i, u['video_id'], u.get('title'), u.get('runtime'))
+                 for i, u in enumerate(uploads)])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO backfills VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (channel_id, int(bool(state['force'])), state['last_seen_id'], state['cursor'], state['index'],
+                 state['length'], int(bool(state['done'])), time.time()))
+            self.conn.commit()
+
+    def clear_backfill(self, channel_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM backfills WHERE channel_id = ?", (channel_id,))
+            self.conn.execute("DELETE FROM backfill_uploads WHERE channel_id = ?", (channel_id,))
+            self.conn.commit()
+
+    def manifest(self, folder):
+        # returns a dictionary of file name -> sha1 of the files last written to a library folder
+        with self.lock:
+            rows = self.conn.execute("SELECT name, sha1 FROM files WHERE folder = ?", (folder,))
+            return dict((row[0], row[1]) for row in rows)
+
+    def update_manifest(self, folder, entries):
+        # record a dictionary of file name -> sha1 written to folder
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO files (folder, name, sha1) VALUES (?, ?, ?)",
+                                  [(folder, name, sha1) for name, sha1 in entries.items()])
+            self.conn.commit()
+
+    def move_manifest(self, old_folder, new_folder):
+        # follow a library folder that was moved, with its manifest and the uploads written to it,
+        # so its videos keep their episode numbers
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE folder = ?", (new_folder,))
+            self.conn.execute("UPDATE files SET folder = ? WHERE folder = ?", (new_folder, old_folder))
+            self.conn.execute("UPDATE uploads SET folder = ? WHERE folder = ?", (new_folder, old_folder))
+            self.conn.commit()
+
+    def forget_file(self, folder, name):
+        with self.lock:
+            self.conn.execute("DELETE FROM files WHERE folder = ? AND name = ?", (folder, name))
+            self.conn.commit()
+
+    def get_state(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+            self.conn.commit()
+
+    def subscriptions(self):
+        # returns the current subscriptions in takeout order
+        # - a list of dictionaries of 'title', 'channel_id' and 'checked', the time its uploads were last listed
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT s.title, s.channel_id, c.checked FROM subscriptions s "
+                "LEFT JOIN channels c ON c.channel_id = s.channel_id "
+                "WHERE s.removed IS NULL ORDER BY s.position")
+            return [dict(row) for row in rows]
+
+    def update_subscriptions(self, subs):
+        # replace the subscription snapshot with subs, a list of dictionaries of 'title' and 'channel_id'
+        # - returns a dictionary of 'added', 'removed' and 'renamed' lists of subscriptions
+        #   - renamed subscriptions also carry their 'old_title'
+        changes = {'added': [], 'removed': [], 'renamed': []}
+        now = time.time()
+        with self.lock:
+            previous = dict((row['channel_id'], dict(row)) for row in
+                            self.conn.execute("SELECT * FROM subscriptions"))
+            current = set()
+            for position, sub in enumerate(subs):
+                current.add(sub['channel_id'])
+                old = previous.get(sub['channel_id'])
+                if old is None or old['removed'] is not None:
+                    changes['added'].append({'title': sub['title'], 'channel_id': sub['channel_id']})
+                    self.conn.execute("INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?, NULL)",
+                                      (sub['channel_id'], sub['title'], position, now))
+                    continue
+                if old['title'] != sub['title']:
+                    changes['renamed'].append(
+                        {'title': sub['title'], 'channel_id': sub['channel_id'], 'old_title': old['title']})
+                    self.conn.execute("UPDATE channels SET title = ? WHERE channel_id = ?",
+                                      (sub['title'], sub['channel_id']))
+                self.conn.execute("UPDATE subscriptions SET title = ?, position = ? WHERE channel_id = ?",
+                                  (sub['title'], position, sub['channel_id']))
+            for channel_id, old in previous.items():
+                if channel_id not in current and old['removed'] is None:
+                    changes['removed'].append({'title': old['title'], 'channel_id': channel_id})
+                    self.conn.execute("UPDATE subscriptions SET removed = ? WHERE channel_id = ?", (now, channel_id))
+            self.conn.commit()
+        return changes
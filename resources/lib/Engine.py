@@ -0,0 +1,1122 @@
+# the scraping and library building side of the addon, free of any kodi module
+# - everything it needs is passed in through a Config, so it runs the same inside kodi, from a cron job
+#   (see resources/lib/Cli.py) or from the benchmarks
+# - an Engine owns the http session, retry policy, worker pool and metadata store its fetchers share,
+#   each created on first use
+
+import os
+import string
+import sys
+import threading
+
+from resources.lib.Metrics import DEBUG, INFO, WARNING, Metrics
+
+valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
+max_failures = 3  # number of syncs a video may fail in before it is skipped for good
+flush_files = 1000  # files a show's writer holds in memory before writing them out
+feed_entries = 15  # uploads youtube lists in a channel's rss feed, the newest
+# seconds a result shown by the plugin's views stays fresh, by kind, see Engine.browse()
+browse_ttl = {'about': 24 * 3600, 'uploads': 3600, 'video': 7 * 24 * 3600}
+months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def log(message, level=INFO, stream=None):
+    # python 2 can not print non-ascii unicode to a pipe, so encode it first
+    if sys.version_info[0] < 3 and not isinstance(message, str):
+        message = message.encode('utf-8')
+    (stream or sys.stdout).write(message + '\n')
+
+
+class SyncAborted(Exception):
+    # raised in place of fetching a channel or video once a sync is told to stop
+    pass
+
+
+def userpass_from_file(file):
+    # retrieve username and password from file
+    with open(file, 'r') as f:
+        username = f.readline().strip()
+        password = f.readline().strip()
+    return username, password
+
+
+def safe_title(title):
+    # a show's title as the name of its folder, made windows-safe
+    return ''.join(c for c in title if c in valid_chars)
+
+
+def show_folder(title):
+    # the library folder of a show, relative to the data folder
+    return 'TV/' + safe_title(title)
+
+
+def clock_runtime(clock):
+    # the minutes of a duration shown as a clock, e.g. "1:14:32" -> '74', as fetch_upload_about() gives 'runtime'
+    minutes = 0
+    for part in clock.split(':')[:-1]:
+        minutes = minutes * 60 + int(part)
+    return str(minutes)
+
+
+def joined_date(joined):
+    # the date a channel joined as its about page shows it, e.g. "Sep 15, 2011" -> '2011-09-15', or None
+    # - read by hand rather than with datetime.strptime(), which fails now and then when python 2 first
+    #   calls it from several threads at once
+    try:
+        month, day, year = joined.replace(',', ' ').split()
+        return '%04d-%02d-%02d' % (int(year), months.index(month[:3].title()) + 1, int(day))
+    except ValueError:
+        return None
+
+
+def listed_upload(video):
+    # an Upload record of a video as a listing shows it, with its runtime if the listing shows its duration
+    from resources.lib.Upload import Upload
+    return Upload(video['video_id'], title=video['title'],
+                  runtime=clock_runtime(video['duration']) if video.get('duration') else None)
+
+
+def is_gone(error):
+    # a removed video or channel will not come back by asking again
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code in (404, 410)
+
+
+class Config:
+    def __init__(self, data, settings=None, youtube_url="https://www.youtube.com", log=log,
+                 interactive=False, defer=None):
+        # - data: folder holding the library, the metadata store and the caches, kodi uses the addon's profile
+        # - settings: function of a setting id returning its value as a string, '' if it is not set,
+        #   like xbmcaddon.Addon().getSetting
+        # - youtube_url: every page is fetched from here, the benchmarks point it at a stand-in
+        # - log: function taking one line of progress and its level, Metrics.DEBUG to Metrics.ERROR,
+        #   it is only handed lines at or above the "log_level" setting
+        # - interactive: someone is waiting on the result, so requests jump ahead of background ones
+        # - defer: optional function returning True while background requests should hold back
+        self.data = data
+        self.settings = settings or (lambda key: '')
+        self.youtube_url = youtube_url
+        self.log = log
+        self.interactive = interactive
+        self.defer = defer
+
+    def get(self, key, default=None):
+        return self.settings(key) or default
+
+    def flag(self, key):
+        return self.get(key) == 'true'
+
+
+class Engine:
+    def __init__(self, config):
+        self.config = config
+        self.data = config.data
+        self.metrics = Metrics()
+        self.profiler = None  # Metrics.Profiler of the sync in progress, if "profile" is set
+        self.lock = threading.Lock()
+        self.db = None
+        self.http = None
+        self.retry = None
+        self.pool = None
+        self.results = None
+        self.artwork = None
+        self.google = None
+        self.stale = []  # (kind, key, refresh) of the results browse() returned past their time to live
+
+    def log(self, message, level=DEBUG):
+        if level >= int(self.config.get('log_level', INFO)):
+            self.config.log(message, level)
+
+    def http_session(self):
+        # lazily open the http session shared by every fetcher
+        # - requests are paced to "request_rate" per second, 0 turns pacing off
+        with self.lock:
+            if self.http is None:
+                from resources.lib.Http import HttpSession
+                from resources.lib.RateLimit import RateLimiter
+                if not os.path.exists(self.data):
+                    os.makedirs(self.data)
+                rate = float(self.config.get('request_rate', 10))
+                self.http = HttpSession(pool_size=int(self.config.get('max_requests', 16)),
+                                        cache_path=os.path.join(self.data, 'http_cache.db'),
+                                        limiter=RateLimiter(rate, defer=self.config.defer) if rate > 0 else None,
+                                        metrics=self.metrics)
+        return self.http
+
+    def google_session(self):
+        # lazily open the session logged in with the user's google account
+        # - its cookies are kept in "google_cookies.lwp", so later runs reuse the login, see SessionGoogle
+        # - "userpass.txt" is only read once it has to log in
+        with self.lock:
+            if self.google is None:
+                from resources.lib.SessionGoogle import SessionGoogle
+                if not os.path.exists(self.data):
+                    os.makedirs(self.data)
+                self.google = SessionGoogle(lambda: userpass_from_file(os.path.join(self.data, 'userpass.txt')),
+                                            cookie_path=os.path.join(self.data, 'google_cookies.lwp'),
+                                            metrics=self.metrics)
+        return self.google
+
+    def retry_policy(self):
+        # lazily build the retry policy shared by every fetcher
+        # - all fetchers share one circuit breaker, since they all talk to youtube
+        with self.lock:
+            if self.retry is None:
+                from resources.lib.Retry import RetryPolicy, CircuitBreaker
+                self.retry = RetryPolicy(attempts=int(self.config.get('retry_attempts', 4)),
+                                         breaker=CircuitBreaker(log=self.log), giveup=is_gone, metrics=self.metrics)
+        return self.retry
+
+    def upload_pool(self):
+        # lazily start the worker pool that fetches video pages for every channel
+        with self.lock:
+            if self.pool is None:
+                from resources.lib.WorkerPool import WorkerPool
+                self.pool = WorkerPool(int(self.config.get('thread_count', 10)))
+        return self.pool
+
+    def database(self):
+        # lazily open the metadata store in the data folder
+        with self.lock:
+            if self.db is None:
+                from resources.lib.Database import Database
+                if not os.path.exists(self.data):
+                    os.makedirs(self.data)
+                self.db = Database(os.path.join(self.data, 'yourtube.db'))
+        return self.db
+
+    def result_cache(self):
+        # lazily open the cache of parsed results for the plugin's views, holding at most "cache_size" MB
+        with self.lock:
+            if self.results is None:
+                from resources.lib.ResultCache import ResultCache
+                if not os.path.exists(self.data):
+                    os.makedirs(self.data)
+                self.results = ResultCache(os.path.join(self.data, 'results.db'),
+                                           max_bytes=int(float(self.config.get('cache_size', 20)) * 1024 * 1024))
+        return self.results
+
+    def artwork_store(self):
+        # lazily open the local store of the library's artwork, holding at most "artwork_size" MB,
+        # or None if the "artwork" setting is off and .nfo files point kodi at youtube's images
+        if not self.config.flag('artwork'):
+            return None
+        with self.lock:
+            if self.artwork is None:
+                from resources.lib.Artwork import ArtworkStore
+                self.artwork = ArtworkStore(os.path.join(self.data, 'artwork'),
+                                            max_bytes=int(float(self.config.get('artwork_size', 500)) * 1024 * 1024))
+        return self.artwork
+
+    def close(self):
+        # let the upload workers exit, the engine starts a new pool if it is used again
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
+
+    def get_page(self, url):
+        # fetch url and return the response body
+        # - every fetcher shares one pooled session
+        # - no more than "max_requests" pages are fetched at once across all sync threads
+        from resources.lib.RateLimit import INTERACTIVE, BACKGROUND
+        return self.http_session().get(url, priority=INTERACTIVE if self.config.interactive else BACKGROUND)
+
+    def fetch_subscriptions(self, force=False):
+        # fetch all subscriptions from youtube-generated rss file
+        # - file is saved as "subscriptions.rss"
+        # - function returns the contents of that file
+        # - if "force" is specified existing "subscriptions.rss" file is ignored
+        import io
+
+        fname = os.path.join(self.data, 'subscriptions.rss')
+        exists = os.path.isfile(fname)
+
+        if (exists and not force):
+            with io.open(fname, 'r', encoding='utf-8') as f:
+                rss = f.read()
+        else:
+            # username = self.config.get('username')
+            # password = self.config.get('password')
+            with self.metrics.span('subscriptions'):
+                rss = self.google_session().get(self.config.youtube_url + "/subscription_manager?action_takeout=1")
+            # only replace the previous file once the download worked
+            with io.open(fname, 'w', encoding='utf-8') as f:
+                f.write(rss)
+        return rss
+
+    def refresh_subscriptions(self, force=False):
+        # bring the subscription snapshot in the metadata store up to date
+        # - "subscriptions.rss" is downloaded again once it is older than "subscriptions_ttl" hours, or if "force"
+        # - the takeout is only parsed if it differs from the one the snapshot was made from
+        # - a changed snapshot is also saved as the plugin's subscription index, see SubscriptionIndex
+        # - returns a dictionary of 'added', 'removed' and 'renamed' subscriptions since the previous snapshot,
+        #   they are also kept in the metadata store until a sync applies them, as the plugin's views refresh too
+        import hashlib
+        import json
+        from resources.lib.Extract import extract_subscriptions
+        from resources.lib.SubscriptionIndex import takeout_stale, write_index
+
+        db = self.database()
+        changes = {'added': [], 'removed': [], 'renamed': []}
+        fname = os.path.join(self.data, 'subscriptions.rss')
+        stale = takeout_stale(self.data, float(self.config.get('subscriptions_ttl', 24)) * 3600)
+        if not (force or stale) and db.get_state('subscriptions_sha1'):
+            return changes
+
+        try:
+            rss = self.fetch_subscriptions(force=force or stale)
+        except Exception as e:
+            if not os.path.isfile(fname):
+                raise
+            self.log("could not refresh subscriptions, keeping the previous ones: %r" % e, WARNING)
+            rss = self.fetch_subscriptions()
+
+        digest = hashlib.sha1(rss.encode('utf-8')).hexdigest()
+        if digest != db.get_state('subscriptions_sha1'):
+            with self.metrics.span('parse.subscriptions'):
+                subs = extract_subscriptions(rss)
+            changes = db.update_subscriptions(subs)
+            pending = json.loads(db.get_state('subscription_changes') or '[]')
+            db.set_state('subscription_changes', json.dumps(pending + [changes]))
+            db.set_state('subscriptions_sha1', digest)
+            write_index(self.data, db.subscriptions())
+            self.log("subscriptions: %s added, %s removed, %s renamed"
+                     % (len(changes['added']), len(changes['removed']), len(changes['renamed'])), INFO)
+        return changes
+
+    def apply_subscription_changes(self):
+        # keep show folders in line with the refreshes of the subscriptions no sync has applied yet,
+        # in the order they were made, see refresh_subscriptions()
+        # - shows of renamed channels are moved to their new title, and get a new tvshow.nfo
+        # - if "archive_removed" is set, shows of unsubscribed channels are moved out of the library into "Archive"
+        #   and moved back if the channel is subscribed to again
+        # - returns the changes applied, a dictionary of 'added', 'removed' and 'renamed' lists of subscriptions
+        import json
+
+        db = self.database()
+        pending = json.loads(db.get_state('subscription_changes') or '[]')
+        applied = {'added': [], 'removed': [], 'renamed': []}
+
+        def move(title, src, dest, old_title=None):
+            # move a show folder, along with its manifest, and return its new folder relative to the library
+            old = src + '/' + safe_title(old_title or title)
+            new = dest + '/' + safe_title(title)
+            old_path = os.path.join(self.data, *old.split('/'))
+            new_path = os.path.join(self.data, *new.split('/'))
+            if old != new and os.path.isdir(old_path) and not os.path.exists(new_path):
+                if not os.path.exists(os.path.dirname(new_path)):
+                    os.makedirs(os.path.dirname(new_path))
+                os.rename(old_path, new_path)
+                db.move_manifest(old, new)
+                return new
+
+        for changes in pending:
+            for sub in changes['renamed']:
+                moved = move(sub['title'], 'TV', 'TV', sub['old_title'])
+                tvshow = os.path.join(self.data, 'TV', safe_title(sub['title']), 'tvshow.nfo')
+                if moved and os.path.exists(tvshow):
+                    os.remove(tvshow)
+                    db.forget_file(moved, 'tvshow.nfo')
+            if self.config.flag('archive_removed'):
+                for sub in changes['removed']:
+                    move(sub['title'], 'TV', 'Archive')
+                for sub in changes['added']:
+                    move(sub['title'], 'Archive', 'TV')
+            for key in applied:
+                applied[key].extend(changes[key])
+        if pending:
+            # a view may have refreshed again in the meantime, keep what it added
+            db.set_state('subscription_changes',
+                         json.dumps(json.loads(db.get_state('subscription_changes') or '[]')[len(pending):]))
+        return applied
+
+    def fetch_channel_about(self, title, channel_id):
+        # returns a dictionary of channel information fetched from the channel's "about" page
+        # - 'thumb' and 'banner' are the urls of the channel's avatar and banner, see nfo_artwork()
+        from resources.lib.Extract import extract_about
+
+        sub = {
+            'title': title,
+            'showtitle': title,
+            'channel_id': channel_id,
+            'studio': 'YouTube'
+        }
+        self.log("Fetching %s" % sub['title'])
+
+        try:
+            html = self.retry_policy().call(self.get_page, self.config.youtube_url + "/channel/" + channel_id + "/about")
+            with self.metrics.span('parse.about'):
+                about = extract_about(html)
+        except Exception:
+            return sub
+        premiered = joined_date(about.pop('joined', ''))
+        if premiered:
+            sub['premiered'] = premiered
+        sub.update(about)
+        return sub
+
+    def channel_about(self, title, channel_id):
+        # fetch_channel_about() for sync, taking a fresh result the plugin's views left in the result cache
+        # and leaving what it fetches there for them
+        cache = self.result_cache()
+        cached = cache.get('about', channel_id)
+        if cached is not None and cached[1] <= browse_ttl['about']:
+            return dict(cached[0], title=title, showtitle=title)
+        about = self.fetch_channel_about(title, channel_id)
+        if 'thumb' in about:
+            cache.put('about', channel_id, about)
+        return about
+
+    def fetch_artwork(self, urls):
+        # store the images at urls that are not in the artwork store yet, several at once on the upload pool
+        # - an image that cannot be fetched is left out, and its .nfo points kodi at youtube as before,
+        #   it is tried again the next time a sync writes the .nfo
+        store = self.artwork_store()
+        urls = store.missing(urls) if store is not None else []
+        if not urls:
+            return
+        http = self.http_session()
+
+        def fetch(url):
+            if store.full():
+                return None
+            return store.put(url, *http.get_binary(url))
+        with self.metrics.span('artwork'):
+            for index, path, error in self.upload_pool().imap_unordered(fetch, urls):
+                if error is not None:
+                    self.log("failed to fetch artwork %s: %r" % (urls[index], error))
+                    self.metrics.count('artwork.failed')
+                elif path is None:
+                    self.metrics.count('artwork.full')
+                else:
+                    self.metrics.count('artwork.fetched')
+
+    def nfo_artwork(self, info):
+        # info as a .nfo gives it to kodi, with the path of each image in the artwork store in place of its url
+        # - a channel's 'banner' goes in as a second 'thumb' with the aspect "banner"
+        # - the store keeps the images from then on, by the 'video_id' or 'channel_id' of the .nfo
+        # - info itself if there is nothing to change
+        store = self.artwork_store()
+        if store is None and 'banner' not in info:
+            return info
+        info = dict(info)
+        owner = info.get('video_id') or info.get('channel_id')
+
+        def local(url, role):
+            return store.local(url, owner + '/' + role) if store is not None and owner else None
+        if 'thumb' in info:
+            info['thumb'] = local(info['thumb'], 'thumb') or info['thumb']
+        if 'banner' in info:
+            banner = info.pop('banner')
+            info['thumb'] = [thumb for thumb in [info.get('thumb')] if thumb] + \
+                [(local(banner, 'banner') or banner, {'aspect': 'banner'})]
+        return info
+
+    def parse_subscriptions(self):
+        # returns a list of subscriptions as dictionaries containing 'title' and 'channel_id'
+        # - read from the snapshot in the metadata store, which is refreshed first if it is stale
+        from resources.lib.SubscriptionIndex import index_path, write_index
+
+        self.refresh_subscriptions()
+        subs = self.database().subscriptions()
+        if not os.path.exists(index_path(self.data)):
+            # made before there was an index
+            write_index(self.data, subs)
+        return subs
+
+    def browse(self, kind, key, fetch, refresh=None, keep=None):
+        # returns the result of fetch() for a plugin view, from the result cache whenever it has it
+        # - a result older than browse_ttl[kind] is still returned straight away, and refreshed by refresh_stale()
+        #   once the view is shown, with refresh(stale result) if given, otherwise fetch()
+        # - a result keep(result) is False for is returned but not cached
+        cache = self.result_cache()
+        cached = cache.get(kind, key)
+        if cached is not None:
+            value, age = cached
+            if age > browse_ttl[kind]:
+                self.stale.append((kind, key, (lambda: refresh(value)) if refresh else fetch, keep))
+            return value
+        value = fetch()
+        if keep is None or keep(value):
+            cache.put(kind, key, value)
+        return value
+
+    def refresh_stale(self):
+        # fetch the results browse() returned stale, so they are fresh the next time they are viewed
+        cache = self.result_cache()
+        while self.stale:
+            kind, key, fetch, keep = self.stale.pop(0)
+            try:
+                value = fetch()
+            except Exception as e:
+                self.log("could not refresh %s %s: %r" % (kind, key, e), WARNING)
+                continue
+            if keep is None or keep(value):
+                cache.put(kind, key, value)
+
+    def view_channel_about(self, title, channel_id):
+        # fetch_channel_about() gives up quietly, leaving out what it could not get, which is not worth keeping
+        return self.browse('about', channel_id, lambda: self.fetch_channel_about(title, channel_id),
+                           keep=lambda about: 'thumb' in about)
+
+    def view_uploads_page(self, channel_id, cursor=None):
+        # one page of channel_id's uploads, newest first, so a view never waits on more than one request
+        # - the first page is the channel's videos page, each page after it the playlist following its cursor
+        # - returns a dictionary of 'uploads', 'next', the cursor of the page after it or None if it is the last,
+        #   and 'total', the number of uploads the channel has or None if the page does not tell
+
+        def fetch():
+            if cursor is None:
+                uploads = [dict(upload) for upload in self.fetch_recent_uploads(channel_id)]
+                return {'uploads': uploads, 'next': uploads[-1]['video_id'] if uploads else None, 'total': None}
+            index, length, uploads = self.fetch_uploads_after(channel_id, cursor)
+            uploads = [dict(upload) for upload in uploads]
+            return {'uploads': uploads, 'next': uploads[-1]['video_id'] if uploads and index < length else None,
+                    'total': length}
+
+        return self.browse('uploads', channel_id + ('@' + cursor if cursor else ''), fetch)
+
+    def view_upload_about(self, video_id):
+        return self.browse('video', video_id, lambda: dict(self.fetch_upload_about(video_id)))
+
+    def fetch_recent_uploads(self, channel_id):
+        # returns the newest uploads of channel_id as listed on its videos page
+        # - a list of Upload records of 'video_id', 'title' and 'runtime' where the page shows it, newest first
+        from resources.lib.Extract import extract_videos
+
+        html = self.retry_policy().call(
+            self.get_page, self.config.youtube_url + "/channel/" + channel_id + "/videos?view=0&sort=dd&flow=list")
+        with self.metrics.span('parse.videos'):
+            videos = extract_videos(html)
+        return [listed_upload(video) for video in videos]
+
+    def fetch_uploads_after(self, channel_id, video_id):
+        # returns (index, length, uploads) from channel_id's uploads playlist as shown while playing video_id
+        # - uploads are the Upload records of 'video_id', 'title' and 'runtime' where the page shows it,
+        #   listed after video_id
+        # - index is the playlist position of the last of them, or length if there are none
+        # - length is the number of videos the playlist claims to have
+        from resources.lib.Extract import extract_playlist
+
+        html = self.retry_policy().call(
+            self.get_page, self.config.youtube_url + "/watch?v=" + video_id + "&list=UU" + channel_id[2:])
+        with self.metrics.span('parse.playlist'):
+            length, playlist = extract_playlist(html)
+
+        # remove items before and including currently playing item
+        for i in range(len(playlist)):
+            if playlist[i]['index'].encode("utf-8") == b'\xe2\x96\xb6':
+                break
+        playlist = playlist[i+1:]
+
+        # sometimes playlist contain fewer items than they purport to
+        # perhaps deleted videos?
+        # this makes sure we dont get stuck in a loop because of it
+        if len(playlist) == 0:
+            # the current url is playing the last item in the playlist
+            index = length
+        else:
+            index = int(playlist[-1]['index'].replace(',', ''))
+
+        return index, length, [listed_upload(video) for video in playlist]
+
+    def fetch_channel_uploads(self, channel_id, force=False, last_seen_id=None, resume=False, should_abort=None):
+        # fetch a list of all upload URLs from channel
+        # - function returns a list of Upload records of 'video_id', 'title' and 'runtime' where the listing
+        #   shows it, newest first
+        #
+        # defaults to only getting URLs until a previously known URL is found
+        #   - if "force" is specified any known URLs are ignored and the full
+        #     list of uploads is retrieved
+        #
+        # if "resume" is specified the listing is checkpointed to the metadata store after every page
+        #   - a later call with the same "force" and "last_seen_id" carries on from the checkpoint
+        #     instead of starting over, or returns the listing straight away if it was complete
+        #   - the checkpoint is kept until clear_backfill(), once the uploads are written
+        # raises SyncAborted between pages once "should_abort" returns True
+        #
+        # ##### methodology:
+        # ##### > go to channel's videos page
+        # ##### > go to url of latest video with "&list=UU" appended
+        # #####	> parse 79 video urls from playlist  (playlist does not include all items in it)
+        # #####	> go to url of last item in the list
+        # #####	> repeat
+        db = self.database()
+        backfill = db.get_backfill(channel_id) if resume else None
+        if backfill and (backfill['force'] != bool(force) or backfill['last_seen_id'] != last_seen_id):
+            # left by a different kind of sync, or by one that has since written newer uploads
+            db.clear_backfill(channel_id)
+            backfill = None
+
+        def checkpoint(page_uploads, done):
+            # the cursor is the video the next page is listed from
+            if resume:
+                db.checkpoint_backfill(channel_id, {
+                    'force': force, 'last_seen_id': last_seen_id,
+                    'cursor': uploads[-1]['video_id'] if uploads else None,
+                    'index': index, 'length': length, 'done': done
+                }, page_uploads)
+
+        seen = False
+        index = 0
+        length = 1
+        if backfill:
+            uploads = backfill['uploads']
+            if backfill['done']:
+                self.log("listing of %s uploads was already complete" % len(uploads))
+                return uploads
+            index, length = backfill['index'], backfill['length']
+            self.log("resuming listing at index %s of %s from %s" % (index, length, backfill['cursor']))
+        else:
+            recent_uploads = self.fetch_recent_uploads(channel_id)
+            uploads = []
+            if last_seen_id and not force:
+                for upload in recent_uploads:
+                    if upload['video_id'] == last_seen_id:
+                        seen = True
+                        break
+                    else:
+                        uploads.append(upload)
+            else:
+                uploads = recent_uploads
+            if force or not seen:
+                checkpoint(uploads, False)
+
+        if not uploads and not seen:
+            # the channel lists no uploads, so there is no video to list the rest of them from
+            self.log("channel lists no uploads")
+            checkpoint([], True)
+            return uploads
+
+        if force or not seen:
+            # fetch more uploads
+            while index < length:
+                if should_abort and should_abort():
+                    raise SyncAborted()
+                index, length, playlist = self.fetch_uploads_after(channel_id, uploads[-1]['video_id'])
+
+                self.log("finding uploads: index %s of %s total" % (index, length))
+
+                page_uploads = []
+                for upload in playlist:
+                    if last_seen_id and not force and upload['video_id'] == last_seen_id:
+                        seen = True
+                        break
+                    page_uploads.append(upload)
+                uploads.extend(page_uploads)
+                checkpoint(page_uploads, (seen and not force) or index >= length)
+
+                if seen and not force:
+                    # caught up with last_seen_id
+                    self.log("encountered recent video_id: %s" % last_seen_id)
+                    break
+
+        else:
+            self.log("last_seen_id found on first page")
+
+        return uploads  # uploads SHOULD be in order and unique
+
+    def fetch_upload_about(self, video_id, force=False):
+        # fetch the information about a video_id
+        # - returns an Upload record of its info
+        # defaults to a lookup in the metadata store
+        #   - if 'force' is specified, existing information is ignored and info is scraped from youtube
+        if not force:
+            known = self.database().get_upload(video_id)
+            if known:
+                self.metrics.count('videos.known')
+                return known
+
+        from resources.lib.Extract import extract_watch
+        from resources.lib.Upload import Upload
+
+        upload = Upload(video_id)
+        html = self.get_page(self.config.youtube_url + "/watch?v=" + video_id)
+        with self.metrics.span('parse.watch'):
+            page = extract_watch(html)
+        self.metrics.count('videos.scraped')
+
+        upload['aired'] = page['aired']
+        upload['title'] = page['title']
+        upload['plot'] = page['plot']
+
+        # get duration in minutes because Kodi's <runtime> is undocumented and minutes works
+        from resources.lib.ISO8601 import convert_to_dict as ISO
+        duration = ISO(page['duration'])
+        runtime = \
+            int(duration['days'] or 0) * 1440 +\
+            int(duration['hours'] or 0) * 60 +\
+            int(duration['minutes'] or 0)
+
+        upload['runtime'] = str(runtime)
+        return upload
+
+    def iter_upload_about(self, video_ids, force=False, should_abort=None):
+        # multithreaded generator for fetch_upload_about() method
+        # - yields (index, upload info, error) tuples in the order they finish, index being the position in video_ids
+        #   - upload info is None and error is set if the video could not be fetched
+        # - video pages are fetched by the shared upload pool, "thread_count" at a time across all channels
+        # - once "should_abort" returns True the videos not fetched yet fail with SyncAborted
+
+        def wrap(video_id):
+            if should_abort and should_abort():
+                raise SyncAborted()
+            with self.metrics.span('scrape'):
+                return self.retry_policy().call(self.fetch_upload_about, video_id, force=force)
+        if self.profiler:
+            wrap = self.profiler.wrap(wrap)
+
+        done = 0
+        for index, upload, error in self.upload_pool().imap_unordered(wrap, video_ids):
+            done += 1
+            if error is not None and not isinstance(error, SyncAborted):
+                self.log("failed to fetch video %s: %r" % (video_ids[index], error), WARNING)
+            if done % 50 == 0:
+                self.log("fetched %s of %s uploads" % (done, len(video_ids)))
+            yield index, upload, error
+
+    def fetch_upload_about_multithreaded(self, video_ids, force=False):
+        # multithreaded wrapper function for fetch_upload_about() method
+        # - takes a list of video_ids and returns a list of upload info in the same order
+        #   - videos that could not be fetched are None
+        uploads = [None] * len(video_ids)
+        for index, upload, error in self.iter_upload_about(video_ids, force=force):
+            uploads[index] = upload
+        return uploads
+
+    def fetch_channel_feed(self, channel_id):
+        # returns the uploads in channel_id's rss feed as Upload records of 'video_id', 'title', 'aired' and 'plot'
+        # - newest first, youtube only lists the latest 15 or so
+        from resources.lib.Extract import extract_feed
+        from resources.lib.Upload import Upload
+
+        xml = self.retry_policy().call(
+            self.get_page, self.config.youtube_url + "/feeds/videos.xml?channel_id=" + channel_id)
+        with self.metrics.span('parse.feed'):
+            entries = extract_feed(xml)
+        return [Upload(entry['video_id'], title=entry['title'], aired=entry['aired'], plot=entry['plot'])
+                for entry in entries]
+
+    def bulk_upload_about(self, channel_id, runtimes):
+        # the information about as many of a channel's uploads as one request can give, instead of their watch pages
+        # - runtimes: dictionary of video_id -> 'runtime' of the uploads wanted, as their listing showed it
+        # - returns a dictionary of video_id -> Upload record, in the shape fetch_upload_about() gives,
+        #   for the uploads that are also in the channel's rss feed, which has the rest of their fields
+        # - gives up quietly, returning nothing, if the feed can not be fetched
+        if not runtimes:
+            return {}
+        try:
+            feed = self.fetch_channel_feed(channel_id)
+        except Exception as e:
+            self.log("could not fetch the feed of %s: %r" % (channel_id, e), WARNING)
+            return {}
+        uploads = {}
+        for upload in feed:
+            if upload.video_id in runtimes and all(key in upload for key in ('title', 'aired', 'plot')):
+                upload['runtime'] = runtimes[upload.video_id]
+                uploads[upload.video_id] = upload
+        self.metrics.count('videos.feed', len(uploads))
+        return uploads
+
+    def lookup_lastseen(self, channel_title):
+        # check the data folder for the most recent episode of channel_title
+        # - returns video_id of latest "cached" episode
+        # - only used to seed the metadata store for channels synced before it existed
+
+        channel_title = safe_title(channel_title)
+        path = os.path.join(self.data, 'TV', channel_title)
+        episodes = [int(f.split('e')[1].split('.')[0]) for f in os.listdir(path) if f.endswith(".strm")]
+        if not episodes:
+            # no episodes seen
+            return None
+
+        latest = str(max(episodes)).zfill(2)
+        with open(os.path.join(path, "s01e" + latest + ".strm"), 'r') as f:
+            contents = f.read()
+
+        last_seen = contents.split('=')[1]
+        self.log("last seen video of %s is %s with episode %s" % (channel_title, last_seen, latest))
+        return last_seen
+
+    def lookup_lastepisode(self, channel_title):
+        # find the highest numbered episode for a channel_title
+        # - returns an int
+        # - only used to seed the metadata store for channels synced before it existed
+
+        channel_title = safe_title(channel_title)
+        path = os.path.join(self.data, 'TV', channel_title)
+        episodes = [int(f.split('e')[1].split('.')[0]) for f in os.listdir(path) if f.endswith(".strm")]
+        if not episodes:
+            # no episodes seen
+            return 0
+
+        else:
+            return max(episodes)
+
+    def sync_fetch_channel(self, sub, force=False, should_abort=None, video_index=None):
+        # listing and metadata stages of sync() for a single subscription
+        # - safe to run for several channels at once
+        # - returns the channel's state, its about info (only if tvshow.nfo is missing or "force" is specified)
+        #   and its Upload records ordered oldest -> newest
+        # - the newest uploads are filled from the channel's rss feed in one request where the listing showed
+        #   their runtime, see bulk_upload_about(), the rest are fetched by fetch_upload_about() one watch page each
+        # - only the video_ids of the listing are kept once it is done, and each video's record is put in its
+        #   place oldest first as it is fetched, so a channel never holds more than one record per upload
+        # - with a VideoIndex, videos another channel already has are left out before anything is fetched
+        # - with the artwork store on, the channel's avatar and banner and the thumbnail of every upload
+        #   are stored before it returns, see fetch_artwork()
+        # - raises SyncAborted if "should_abort" returned True before all of its videos were fetched
+        db = self.database()
+        folder = show_folder(sub['title'])
+        sub_folder = os.path.join(self.data, *folder.split('/'))
+        about = None
+        missing = 'tvshow.nfo' not in db.manifest(folder) and \
+            not os.path.exists(os.path.join(sub_folder, 'tvshow.nfo'))
+        if missing or force:
+            about = self.channel_about(sub['title'], sub['channel_id'])
+            if not missing and 'thumb' not in about:
+                # the about page could not be read, keep the tvshow.nfo there is
+                about = None
+
+        self.log("finding uploads for channel %s" % sub['title'])
+
+        channel = db.get_channel(sub['channel_id'])
+        if channel is None:
+            # first sync since the metadata store was added, seed it from the existing library
+            if os.path.isdir(sub_folder):
+                db.add_channel(sub['channel_id'], sub['title'],
+                               self.lookup_lastseen(sub['title']), self.lookup_lastepisode(sub['title']))
+            else:
+                db.add_channel(sub['channel_id'], sub['title'])
+            channel = db.get_channel(sub['channel_id'])
+
+        with self.metrics.span('list'):
+            uploads = self.fetch_channel_uploads(sub['channel_id'], force=force, last_seen_id=channel['last_seen_id'],
+                                                 resume=True, should_abort=should_abort)
+
+        self.log("%s new uploads for channel %s" % (len(uploads), sub['title']))
+
+        # videos that failed in "max_failures" syncs are skipped, other earlier failures are tried again as the oldest
+        failures = db.failures(sub['channel_id'])
+        skip = set(video_id for video_id, count in failures if count >= max_failures)
+        # the newest video listed, which the next sync lists from whatever becomes of it
+        last_seen_id = uploads[0].video_id if uploads else None
+        video_ids = [upload.video_id for upload in uploads if upload.video_id not in skip]
+        runtimes = dict((upload.video_id, upload['runtime'])
+                        for upload in uploads[:feed_entries] if 'runtime' in upload)
+        del uploads
+        listed = set(video_ids)
+        video_ids += [video_id for video_id, count in failures[::-1] if video_id not in skip and video_id not in listed]
+        if video_index is not None:
+            claimed = video_index.claim(sub['channel_id'], video_ids)
+            if len(claimed) < len(video_ids):
+                self.log("%s uploads of channel %s belong to other channels" % (len(video_ids) - len(claimed),
+                                                                                 sub['title']))
+                self.metrics.count('videos.duplicate', len(video_ids) - len(claimed))
+            video_ids = claimed
+
+        # videos already in the metadata store keep their episode number and are only re-scraped when forced
+        known = db.known_episodes(video_ids)
+        bulk = self.bulk_upload_about(sub['channel_id'], dict(
+            (video_id, runtime) for video_id, runtime in runtimes.items() if force or video_id not in known))
+        del runtimes
+        from resources.lib.Retry import CircuitOpen, RetryError
+        # video_ids are newest first, their records go in oldest -> newest
+        uploads = [None] * len(video_ids)
+        last = len(video_ids) - 1
+        scrape = []  # positions in video_ids of the videos bulk_upload_about() did not fill
+        for index, video_id in enumerate(video_ids):
+            if video_id in bulk:
+                uploads[last - index] = bulk.pop(video_id)
+            else:
+                scrape.append(index)
+        for n, upload, error in self.iter_upload_about([video_ids[index] for index in scrape], force=force,
+                                                       should_abort=should_abort):
+            index = scrape[n]
+            if error is not None and not isinstance(error, SyncAborted):
+                # a video is tried again by later syncs, but only held against it if it was actually tried
+                db.record_failure(sub['channel_id'], video_ids[index],
+                                  repr(error.error if isinstance(error, RetryError) else error),
+                                  count=0 if isinstance(error, CircuitOpen) else 1)
+            uploads[last - index] = upload
+        if should_abort and should_abort():
+            # the videos that were fetched are not written, so last_seen_id stays put and the next sync fetches them
+            raise SyncAborted()
+
+        # drop the videos that could not be fetched, in place
+        kept = 0
+        for upload in uploads:
+            if upload is not None:
+                uploads[kept] = upload
+                kept += 1
+        del uploads[kept:]
+        if self.artwork_store() is not None:
+            self.fetch_artwork([about[key] for key in ('thumb', 'banner') if about and key in about] +
+                               [upload.thumb for upload in uploads])
+        return {'channel': channel, 'about': about, 'uploads': uploads, 'known': known, 'force': force,
+                'last_seen_id': last_seen_id}
+
+    def show_router(self):
+        # returns a Router of the shows in "shows.json" in the data folder, or None if there is no such file
+        # - the file holds a list of {"title": show title, "rules": postfix rule string or list of its tokens},
+        #   see resources/lib/Rules.py, and is read again for every sync
+        # - raises ValueError if any of the rules does not make sense
+        import json
+        from resources.lib.Rules import Router
+
+        path = os.path.join(self.data, 'shows.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            shows = json.load(f)
+        return Router([(show['title'], show['rules']) for show in shows])
+
+    def folder_last_episode(self, folder):
+        # returns the highest episode number written to a show folder, by the channel it belongs to or by rules
+        db = self.database()
+        last = db.folder_last_episode(folder)
+        for channel in db.channels():
+            if show_folder(channel['title']) == folder:
+                last = max(last, channel['last_episode'])
+        return last
+
+    def sync_write_channels(self, batch, merged=frozenset()):
+        # writing stage of sync() for a list of (subscription, what sync_fetch_channel() returned for it)
+        # - only ever run from one thread, so episode numbers only depend on what was written before
+        # - uploads go into the channel's own show, unless the 'shows' sync_channels() routed them to
+        #   (see show_router()) send them to another show
+        # - a video keeps its episode number as long as it stays in the same show, new videos are numbered on from
+        #   the highest episode written to their show by any channel, in the order they were listed,
+        #   except in "merged" show folders, those that rules route uploads into, where the new videos
+        #   of every channel in batch are numbered together by their aired date
+        # - the files of a show are written in batches of "flush_files", skipping those whose content did not change
+        # - .nfo files point kodi at the artwork store's copy of their images where it has one, see nfo_artwork()
+        # - returns the show folders that had any of their files written
+        from resources.lib.LibraryWriter import LibraryWriter
+
+        db = self.database()
+        force = any(fetched['force'] for sub, fetched in batch)
+        writers = {}
+        next_ep = {}
+
+        def writer(target, title=None, last_episode=0):
+            if target not in writers:
+                manifest = db.manifest(target)
+                writers[target] = LibraryWriter(self.data, target, manifest, verify=force)
+                next_ep[target] = max(last_episode, self.folder_last_episode(target))
+                # a show of its own gets a bare tvshow.nfo, one that is also a channel's keeps the channel's
+                if title is not None and 'tvshow.nfo' not in manifest and \
+                        not os.path.exists(os.path.join(self.data, *(target.split('/') + ['tvshow.nfo']))):
+                    writers[target].add_nfo('tvshow.nfo', 'tvshow', {'title': title, 'showtitle': title})
+            return writers[target]
+
+        def flush(target):
+            before = writers[target].written
+            with self.metrics.span('write'):
+                entries = writers[target].flush()
+            db.update_manifest(target, entries)
+            self.metrics.count('files.unchanged', len(entries) - (writers[target].written - before))
+
+        def add(target, upload):
+            name = "s" + upload['season'] + "e" + upload['episode']
+            writers[target].add_nfo(name + ".nfo", 'episodedetails', self.nfo_artwork(upload))
+            writers[target].add_strm(name + ".strm", upload['video_id'])
+            if len(writers[target].pending) >= flush_files:
+                flush(target)
+
+        # a channel whose uploads all go to other shows gets no show of its own
+        for sub, fetched in batch:
+            folder = show_folder(sub['title'])
+            shows = fetched.get('shows')
+            if fetched['about'] is not None and (shows is None or None in shows or db.manifest(folder)):
+                writer(folder, last_episode=fetched['channel']['last_episode']).add_nfo(
+                    'tvshow.nfo', 'tvshow', self.nfo_artwork(fetched['about']))
+
+        new = {}  # show folder -> uploads to number in it
+        for sub, fetched in batch:
+            folder = show_folder(sub['title'])
+            known = fetched['known']
+            fetched['routed'] = {}
+            for upload, show in zip(fetched['uploads'], fetched.get('shows') or [None] * len(fetched['uploads'])):
+                target = folder if show is None else show_folder(show)
+                if target != folder:
+                    fetched['routed'][upload['video_id']] = target
+                writer(target, show, fetched['channel']['last_episode'] if target == folder else 0)
+                upload['season'] = '01'  # TODO
+                episode, written_to = known.get(upload['video_id'], (None, None))
+                # a video keeps its episode number as long as it stays in the same show
+                if episode is not None and (written_to or folder) == target:
+                    upload['episode'] = episode
+                    add(target, upload)
+                else:
+                    new.setdefault(target, []).append(upload)
+
+        for target in sorted(new):
+            uploads = new[target]
+            if target in merged:
+                # a stable sort, so videos aired on the same day stay in the order they were listed
+                uploads.sort(key=lambda upload: upload.get('aired') or '')
+            for upload in uploads:
+                next_ep[target] += 1
+                upload['episode'] = str(next_ep[target]).zfill(2)
+                add(target, upload)
+
+        written = []
+        for target in sorted(writers):
+            flush(target)
+            self.metrics.count('files.written', writers[target].written)
+            if writers[target].written:
+                written.append(target)
+        for sub, fetched in batch:
+            db.add_uploads(sub['channel_id'], fetched['uploads'], show_folder(sub['title']), fetched['routed'],
+                           fetched['last_seen_id'])
+            db.clear_backfill(sub['channel_id'])
+            db.set_checked(sub['channel_id'])
+        if self.artwork_store() is not None:
+            self.artwork_store().commit()
+        return written
+
+    def sync(self, force=False, started=None, should_stop=None, should_abort=None, progress=None):
+        # sync subscriptions into the library as a staged pipeline
+        # - subscriptions are refreshed once, and show folders follow renamed and removed channels
+        # - only channels that are new, renamed or were last checked over "check_interval" hours ago are synced,
+        #   unless "force" is specified
+        # - channels checked since "started", a time.time(), are skipped, so a pass split into several syncs
+        #   never checks a channel twice
+        # - a bounded pool of channel workers lists and scrapes uploads for several channels at once
+        # - the calling thread writes each channel as soon as its worker is done with it
+        # - once "should_stop" returns True no more channels are started, those already started are finished
+        # - once "should_abort" returns True channels in progress are dropped as well, and no video is fetched
+        # - "progress" is called with (done, total, title) as each channel is done with
+        # - returns a dictionary of the number of channels 'synced', 'failed' and 'skipped' by stopping,
+        #   and the show 'folders' that had files written
+        # - every sync is measured, see report_sync()
+        from resources.lib.Metrics import Profiler
+
+        self.metrics.reset()
+        self.profiler = Profiler() if self.config.flag('profile') else None
+        summary = {'synced': 0, 'failed': 0, 'skipped': 0, 'folders': []}
+        try:
+            run = self.profiler.wrap(self.sync_channels) if self.profiler else self.sync_channels
+            run(summary, force, started, should_stop, should_abort, progress)
+        finally:
+            self.report_sync(summary)
+            self.profiler = None
+        return summary
+
+    def sync_channels(self, summary, force, started, should_stop, should_abort, progress):
+        # the work of sync(), counting channels into summary as they are done with
+        # - a VideoIndex shared by the channels makes sure no video is written for two of them, a video several
+        #   channels list goes to the first of them in subscription order, so a channel is only written once
+        #   every channel before it has claimed its videos
+        # - channels feeding a show merged by rules are written together once every channel is fetched,
+        #   so their new episodes are numbered by aired date, the rest are written as soon as they are fetched
+        import time
+        from resources.lib.VideoIndex import VideoIndex
+        from resources.lib.WorkerPool import WorkerPool
+
+        router = self.show_router()
+        self.refresh_subscriptions()
+        changes = self.apply_subscription_changes()
+
+        changed = set(sub['channel_id'] for sub in changes['added'] + changes['renamed'])
+        interval = float(self.config.get('check_interval', 0)) * 3600
+        now = time.time()
+        subs = [sub for sub in self.database().subscriptions()
+                if (force or sub['channel_id'] in changed or now - (sub['checked'] or 0) >= interval)
+                and not (started and (sub['checked'] or 0) >= started)]
+        total_subs = len(subs)
+        channels = WorkerPool(min(int(self.config.get('channel_threads', 4)), total_subs))
+        video_index = VideoIndex(self.database(), [sub['channel_id'] for sub in subs])
+        merged = frozenset(show_folder(title) for title, tree in router.shows) if router else frozenset()
+        fetched = {}  # index in subs -> result of a channel fetched before the channels ahead of it claimed
+        deferred = []
+        # set if the sync leaves early with an error, so channels still queued or in progress give up
+        # rather than go on fetching in the background
+        left = threading.Event()
+
+        def abort():
+            return left.is_set() or bool(should_abort and should_abort())
+
+        def fetch(sub):
+            if (should_stop and should_stop()) or abort():
+                raise SyncAborted()
+            return self.sync_fetch_channel(sub, force=force, should_abort=abort, video_index=video_index)
+        if self.profiler:
+            fetch = self.profiler.wrap(fetch)
+
+        def write(batch):
+            summary['folders'].extend(self.sync_write_channels(batch, merged))
+            summary['synced'] += len(batch)
+
+        def route(sub, result):
+            uploads = video_index.keep(sub['channel_id'], result['uploads'])
+            if len(uploads) < len(result['uploads']):
+                self.log("%s uploads of channel %s were claimed by channels before it"
+                         % (len(result['uploads']) - len(uploads), sub['title']))
+                self.metrics.count('videos.duplicate', len(result['uploads']) - len(uploads))
+                result['uploads'] = uploads
+            result['shows'] = router.route(sub['channel_id'], uploads) if router else None
+            if uploads and (show_folder(sub['title']) in merged or
+                            any(show is not None for show in result['shows'] or [])):
+                deferred.append((sub, result))
+            else:
+                write([(sub, result)])
+
+        try:
+            current_sub = 1
+            for index, result, error in channels.imap_unordered(fetch, subs):
+                self.log("processing sub %s of %s" % (current_sub, total_subs))
+                current_sub += 1
+                video_index.settle(subs[index]['channel_id'])
+                if isinstance(error, SyncAborted):
+                    summary['skipped'] += 1
+                elif error is not None:
+                    self.log("failed to fetch channel %s: %r" % (subs[index]['title'], error), WARNING)
+                    summary['failed'] += 1
+                else:
+                    fetched[index] = result
+                for ready in sorted(fetched):
+                    if not video_index.decided(subs[ready]['channel_id']):
+                        break
+                    route(subs[ready], fetched.pop(ready))
+                if progress:
+                    progress(current_sub - 1, total_subs, subs[index]['title'])
+        finally:
+            left.set()
+            channels.close()
+        # every channel has settled
+        for ready in sorted(fetched):
+            route(subs[ready], fetched.pop(ready))
+        if deferred:
+            write(deferred)
+
+    def report_sync(self, summary):
+        # log where the time of a sync went, and keep it as a line of json in "sync_metrics.jsonl"
+        # - the file holds the last 50 syncs, one json object of Metrics.summary() and the sync's summary each
+        # - with "profile" set, cProfile stats of every thread of the sync are written to "sync.prof"
+        import json
+        from resources.lib.Metrics import summary_lines
+
+        report = self.metrics.summary()
+        report['sync'] = summary
+        lines = summary_lines(report)
+        self.log("sync: %s synced, %s failed, %s skipped in %s"
+                 % (summary['synced'], summary['failed'], summary['skipped'], lines[0]), INFO)
+        for line in lines[1:]:
+            self.log(line)
+
+        if not os.path.exists(self.data):
+            return
+        path = os.path.join(self.data, 'sync_metrics.jsonl')
+        history = []
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                history = f.read().splitlines()[-49:]
+        history.append(json.dumps(report, sort_keys=True))
+        with open(path, 'w') as f:
+            f.write('\n'.join(history) + '\n')
+        if self.profiler:
+            self.profiler.dump(os.path.join(self.data, 'sync.prof'))
+            self.log("profile of the sync written to %s" % os.path.join(self.data, 'sync.prof'), INFO)
@@ -0,0 +1,184 @@
+# targeted extraction of the few fields read from youtube pages
+# - precompiled patterns instead of building a full BeautifulSoup tree per page
+# - each extractor stops searching as soon as it has what it needs
+# - output matches what the BeautifulSoup code it replaces produced (see benchmarks/bench_extract.py)
+# - the rss feed is read the same way, as it is only ever searched for a few tags
+
+import re
+
+try:
+    from html import unescape
+except ImportError:
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
+ATTRIBUTE_rx = re.compile(r'([\w:-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+TAG_rx = re.compile(r'<[^>]*>')
+# the rest of a tag, allowing for a ">" within quoted attribute values
+TAG_END_rx = re.compile(r'(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+
+META_rx = re.compile(r'<meta\s[^>]*?itemprop="(datePublished|name|duration)"')
+DESCRIPTION_rx = re.compile(r'<p\s[^>]*?id="eow-description"[^>]*>(.*?)</p>', re.S)
+
+PLAYLIST_LENGTH_rx = re.compile(r'<span\s[^>]*?id="playlist-length"[^>]*>(.*?)</span>', re.S)
+PLAYLIST_ITEM_rx = re.compile(r'<li\s[^>]*?class="(?:[^"]*\s)?yt-uix-scroller-scroll-unit(?:\s[^"]*)?"')
+FIRST_SPAN_rx = re.compile(r'<span\b[^>]*>(.*?)</span>', re.S)
+VIDEO_TIME_rx = re.compile(r'class="video-time"[^>]*>\s*([\d:]+)')
+
+LOCKUP_TITLE_rx = re.compile(r'<h3\s[^>]*?class="(?:[^"]*\s)?yt-lockup-title(?:\s[^"]*)?"[^>]*>')
+LINK_rx = re.compile(r'<a\s')
+LOCKUP_DURATION_rx = re.compile(r'class="accessible-description"[^>]*>\s*-\s*Duration:\s*([\d:]+)')
+
+ENTRY_rx = re.compile(r'<entry>(.*?)</entry>', re.S)
+ENTRY_FIELD_rx = re.compile(r'<(yt:videoId|title|published|media:description)>([^<]*)</\1>')
+
+OUTLINE_rx = re.compile(r'<outline\s')
+
+FORM_rx = re.compile(r'<form\b.*?(?:</form>|$)', re.S)
+INPUT_rx = re.compile(r'<input\s')
+
+AVATAR_rx = re.compile(r'<img\s[^>]*?class="(?:[^"]*\s)?channel-header-profile-image(?:\s[^"]*)?"')
+BANNER_rx = re.compile(r'id="gh-banner".*?background-image:\s*url\(\s*[\'"]?([^\'")]+)', re.S)
+PRE_rx = re.compile(r'<pre\b[^>]*>(.*?)</pre>', re.S)
+ABOUT_STAT_rx = re.compile(r'<span\s[^>]*?class="(?:[^"]*\s)?about-stat(?:\s[^"]*)?"[^>]*>(.*?)</span>', re.S)
+
+
+def tag_at(html, m):
+    # returns the whole tag whose start was matched by m
+    end = TAG_END_rx.match(html, m.end())
+    return html[m.start():end.end()] if end else html[m.start():]
+
+
+def attributes(tag):
+    # returns a dictionary of the unescaped attributes of a single html tag
+    return dict((m.group(1).lower(), unescape(m.group(2) if m.group(2) is not None else m.group(3)))
+                for m in ATTRIBUTE_rx.finditer(tag))
+
+
+def text(html):
+    # returns the unescaped text of an html fragment
+    return unescape(TAG_rx.sub('', html))
+
+
+def extract_watch(html):
+    # returns a dictionary of 'aired', 'title', 'duration' and 'plot' from a watch page
+    # - a field is missing if the page does not have it
+    watch = {}
+    names = {'datePublished': 'aired', 'name': 'title', 'duration': 'duration'}
+    end = 0
+    for m in META_rx.finditer(html):
+        key = names[m.group(1)]
+        if key not in watch:
+            watch[key] = attributes(tag_at(html, m)).get('content')
+            end = m.end()
+            if len(watch) == len(names):
+                break
+
+    # the description follows the meta tags, but fall back to the whole page if it does not
+    m = DESCRIPTION_rx.search(html, end) or DESCRIPTION_rx.search(html)
+    if m:
+        watch['plot'] = ''.join(unescape(s) + '\n' for s in TAG_rx.split(m.group(1)) if s)
+    return watch
+
+
+def extract_playlist(html):
+    # returns (length, items) from the playlist sidebar of a watch page
+    # - length is the number of videos the playlist claims to have, or None
+    # - items is a list of dictionaries of 'index' (the text of its first span), 'video_id', 'title'
+    #   and 'duration', as shown on the item's thumbnail e.g. "1:14:32", or None
+    m = PLAYLIST_LENGTH_rx.search(html)
+    length = int(text(m.group(1)).split(" ")[0].replace(',', '')) if m else None
+
+    items = []
+    starts = list(PLAYLIST_ITEM_rx.finditer(html))
+    for i, m in enumerate(starts):
+        end = starts[i + 1].start() if i + 1 < len(starts) else len(html)
+        tag = tag_at(html, m)
+        attrs = attributes(tag)
+        span = FIRST_SPAN_rx.search(html, m.start() + len(tag))
+        clock = VIDEO_TIME_rx.search(html, m.end(), end)
+        items.append({
+            'index': text(span.group(1)).strip() if span else '',
+            'video_id': attrs.get('data-video-id'),
+            'title': attrs.get('data-video-title'),
+            'duration': clock.group(1) if clock else None
+        })
+    return length, items
+
+
+def extract_videos(html):
+    # returns a list of dictionaries of 'video_id', 'title' and 'duration' from a channel's videos page
+    # - duration is as the page describes it e.g. "11:43", or None
+    videos = []
+    starts = list(LOCKUP_TITLE_rx.finditer(html))
+    for i, m in enumerate(starts):
+        end = starts[i + 1].start() if i + 1 < len(starts) else len(html)
+        link = attributes(tag_at(html, LINK_rx.search(html, m.end())))
+        duration = LOCKUP_DURATION_rx.search(html, m.end(), end)
+        videos.append({'title': link['title'], 'video_id': link['href'].split('=')[1],
+                       'duration': duration.group(1) if duration else None})
+    return videos
+
+
+def extract_feed(xml):
+    # returns a list of dictionaries of 'video_id', 'title', 'aired' and 'plot' from a channel's rss feed
+    # - newest first, youtube only lists the latest 15 or so uploads
+    # - aired and plot are in the shape extract_watch() gives them, a date and a line per line of text
+    entries = []
+    for m in ENTRY_rx.finditer(xml):
+        fields = dict((f.group(1), unescape(f.group(2))) for f in ENTRY_FIELD_rx.finditer(m.group(1)))
+        if 'yt:videoId' not in fields:
+            continue
+        entries.append({
+            'video_id': fields['yt:videoId'],
+            'title': fields.get('title'),
+            'aired': fields.get('published', '')[:10] or None,
+            'plot': ''.join(line + '\n' for line in fields.get('media:description', '').split('\n') if line)
+        })
+    return entries
+
+
+def extract_about(html):
+    # returns a dictionary of 'thumb', 'banner', 'plot' and 'joined' from a channel's about page
+    # - thumb and banner are the urls of the channel's avatar and banner, joined is as the page shows it,
+    #   e.g. "Sep 15, 2011"
+    # - a field is missing if the page does not have it
+    about = {}
+    m = AVATAR_rx.search(html)
+    if m:
+        about['thumb'] = attributes(tag_at(html, m)).get('src')
+    m = BANNER_rx.search(html)
+    if m:
+        about['banner'] = ('https:' if m.group(1).startswith('//') else '') + unescape(m.group(1))
+    m = PRE_rx.search(html)
+    if m:
+        about['plot'] = text(m.group(1))
+    stats = ABOUT_STAT_rx.findall(html)
+    if len(stats) > 2:
+        about['joined'] = text(stats[2]).strip().split(" ", 1)[-1]
+    return about
+
+
+def extract_form(html):
+    # returns a dictionary of the name and value of each input of the first form on a page that has both,
+    # e.g. the hidden fields a login form posts back
+    m = FORM_rx.search(html)
+    if not m:
+        return {}
+    form = m.group(0)
+    fields = {}
+    for i in INPUT_rx.finditer(form):
+        attrs = attributes(tag_at(form, i))
+        if 'name' in attrs and 'value' in attrs:
+            fields[attrs['name']] = attrs['value']
+    return fields
+
+
+def extract_subscriptions(opml):
+    # returns a list of dictionaries of 'title' and 'channel_id' from a subscription_manager takeout
+    subs = []
+    for m in OUTLINE_rx.finditer(opml):
+        outline = attributes(tag_at(opml, m))
+        if outline.get('type') == 'rss':
+            subs.append({'title': outline['title'], 'channel_id': outline['xmlurl'].split('=')[1]})
+    return subs
@@ -0,0 +1,133 @@
+# shared http session for every fetcher
+# - one keep-alive connection pool instead of a new TCP+TLS handshake per page
+# - pages served with an ETag or Last-Modified header are kept in a small on-disk cache and revalidated,
+#   so unchanged pages come back as an empty 304
+# - an optional RateLimiter paces the requests for pages and slows down when youtube pushes back
+# - an optional Metrics counts requests, bytes and status codes, and times waiting for the limiter and the requests
+
+import sqlite3
+import threading
+import time
+import zlib
+
+from resources.lib.RateLimit import BACKGROUND
+
+
+class ValidatorCache:
+    def __init__(self, path, max_entries=2000):
+        # keeps the validators and body of the most recently stored "max_entries" pages
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages "
+                "(url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB, stored REAL)")
+            self.conn.commit()
+
+    def get(self, url):
+        # returns (etag, last_modified, body) or None
+        with self.lock:
+            row = self.conn.execute("SELECT etag, last_modified, body FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], zlib.decompress(bytes(row[2])).decode('utf-8')
+
+    def put(self, url, etag, last_modified, body):
+        body = sqlite3.Binary(zlib.compress(body.encode('utf-8')))
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                              (url, etag, last_modified, body, time.time()))
+            self.conn.execute(
+                "DELETE FROM pages WHERE url NOT IN (SELECT url FROM pages ORDER BY stored DESC LIMIT ?)",
+                (self.max_entries,))
+            self.conn.commit()
+
+    def touch(self, url):
+        # mark a revalidated page as recently stored so it is not the next one evicted
+        with self.lock:
+            self.conn.execute("UPDATE pages SET stored = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+
+
+def retry_after(response):
+    # returns the seconds a 429 or 503 response asks to wait, or None
+    # - only the delay-seconds form is understood, and it is capped at 5 minutes
+    value = response.headers.get('Retry-After', '').strip()
+    return min(int(value), 300) if value.isdigit() else None
+
+
+class HttpSession:
+    def __init__(self, pool_size=16, cache_path=None, timeout=30, limiter=None, metrics=None):
+        # - pool_size: number of kept-alive connections, and the maximum number of requests in flight
+        # - cache_path: optional sqlite file for revalidating pages
+        # - limiter: optional RateLimiter every request waits on
+        # - metrics: optional Metrics the requests are recorded in
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        requests.packages.urllib3.disable_warnings()
+        self.timeout = timeout
+        self.limit = threading.BoundedSemaphore(pool_size)
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.cache = ValidatorCache(cache_path) if cache_path else None
+        self.limiter = limiter
+        self.metrics = metrics
+
+    def send(self, url, headers, priority=BACKGROUND, paced=True):
+        # make one request and return the response, whatever its status
+        # - paced: wait on the limiter and tell it about throttling, only requests to youtube's pages are
+        #   paced, as images come from its content servers
+        if self.limiter and paced:
+            start = time.time()
+            self.limiter.acquire(priority)
+            if self.metrics:
+                self.metrics.record('http.wait', time.time() - start)
+        start = time.time()
+        with self.limit:
+            r = self.session.get(url, headers=headers, timeout=self.timeout)
+        if self.metrics:
+            self.metrics.record('http.request', time.time() - start)
+            self.metrics.count('http.requests')
+            self.metrics.count('http.status.%s' % r.status_code)
+            self.metrics.count('http.bytes', len(r.content))
+        if self.limiter and paced:
+            # throttling shows up as a 429, or a redirect to a captcha page that answers 429 or 503
+            if r.status_code in (429, 503):
+                self.limiter.throttled(retry_after(r))
+            elif r.status_code < 400:
+                self.limiter.succeeded()
+        return r
+
+    def get(self, url, priority=BACKGROUND):
+        # fetch url and return the response body
+        # - priority: RateLimit.INTERACTIVE or BACKGROUND, where the request waits in the limiter's queue
+        # - raises requests.HTTPError for error statuses
+        headers = {}
+        cached = self.cache.get(url) if self.cache else None
+        if cached:
+            etag, last_modified, body = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        r = self.send(url, headers, priority)
+        if r.status_code == 304 and cached:
+            self.cache.touch(url)
+            return cached[2]
+        r.raise_for_status()
+        if self.cache and (r.headers.get('ETag') or r.headers.get('Last-Modified')):
+            self.cache.put(url, r.headers.get('ETag'), r.headers.get('Last-Modified'), r.text)
+        return r.text
+
+    def get_binary(self, url):
+        # fetch an image or other binary file, unpaced and uncached, and return (body as bytes, content type)
+        # - raises requests.HTTPError for error statuses
+        r = self.send(url, {}, paced=False)
+        r.raise_for_status()
+        return r.content, r.headers.get('Content-Type', '')
@@ -0,0 +1,94 @@
+# batched writer for the .nfo and .strm files of one show folder
+# - files are collected in memory and written in one go by flush()
+# - each file is written to a temporary file first and renamed over the old one, so kodi never reads half a file
+# - a manifest of content hashes means files whose content did not change are never touched,
+#   not even with a stat, so kodi's library scanner sees no spurious mtime changes
+
+import errno
+import hashlib
+import io
+import os
+import xml.etree.ElementTree as ET
+
+
+def replace(src, dest):
+    # atomically rename src over dest where the platform allows it
+    if hasattr(os, 'replace'):
+        os.replace(src, dest)
+    else:
+        if os.name == 'nt' and os.path.exists(dest):
+            os.remove(dest)
+        os.rename(src, dest)
+
+
+class LibraryWriter:
+    def __init__(self, root, folder, manifest, verify=False):
+        # - root: library root on disk
+        # - folder: show folder relative to root, e.g. "TV/Numberphile"
+        # - manifest: dictionary of file name -> sha1 of the content last written there
+        # - verify: also rewrite files in the manifest that no longer exist on disk
+        self.path = os.path.join(root, *folder.split('/'))
+        self.manifest = manifest
+        self.verify = verify
+        self.pending = []
+        self.written = 0  # number of files flush() actually wrote
+
+    def add(self, name, content):
+        # queue content, a byte string, to be written to name
+        self.pending.append((name, content))
+
+    def add_nfo(self, name, root_tag, info):
+        # queue a dictionary of info as an xml .nfo for kodi
+        # - tags are sorted so the same info always gives the same file
+        # - a list value is written as one tag per item, in order, an item of (text, dictionary of attributes)
+        #   as a tag with those attributes, e.g. kodi's <thumb aspect="banner">
+        root = ET.Element(root_tag)
+        for tag in sorted(info):
+            for value in info[tag] if isinstance(info[tag], list) else [info[tag]]:
+                value, attrib = value if isinstance(value, tuple) else (value, {})
+                ET.SubElement(root, tag, attrib).text = value
+        content = io.BytesIO()
+        ET.ElementTree(root).write(content, encoding='utf-8', xml_declaration=True)
+        self.add(name, content.getvalue())
+
+    def add_strm(self, name, video_id):
+        self.add(name, ('plugin://plugin.video.youtube/play/?video_id=' + video_id).encode('utf-8'))
+
+    def fpath(self, name):
+        return os.path.join(self.path, name)
+
+    def unchanged(self, name, digest):
+        if name in self.manifest:
+            return self.manifest[name] == digest and not (self.verify and not os.path.exists(self.fpath(name)))
+        # not written by this writer yet, but an identical file from an older version may already be there
+        try:
+            with open(self.fpath(name), 'rb') as f:
+                return hashlib.sha1(f.read()).hexdigest() == digest
+        except (IOError, OSError):
+            return False
+
+    def flush(self):
+        # write every queued file whose content changed
+        # - returns a dictionary of file name -> sha1 for the manifest, covering every queued file
+        entries = {}
+        made = False
+        for name, content in self.pending:
+            digest = hashlib.sha1(content).hexdigest()
+            entries[name] = digest
+            if self.unchanged(name, digest):
+                continue
+            if not made:
+                try:
+                    os.makedirs(self.path)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        raise
+                made = True
+            tmp = self.fpath(name) + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            replace(tmp, self.fpath(name))
+            self.written += 1
+        self.pending = []
+        self.manifest.update(entries)
+        return entries
@@ -0,0 +1,134 @@
+# lightweight instrumentation of the engine, to see where the time of a sync goes
+# - spans time named stages (login, listing, scraping, parsing, writing), counters count what was done
+#   (requests, bytes, status codes, retries, files written), both are thread safe and cheap enough to leave on
+# - span times are summed over every thread that ran the stage, so parallel stages can add up to more than
+#   the wall time of the sync
+# - an optional Profiler collects cProfile stats from every thread it wraps a function for
+# - log levels match the order of kodi's, see kodi_log()
+
+import sys
+import threading
+import time
+
+DEBUG = 0
+INFO = 1
+WARNING = 2
+ERROR = 3
+
+
+class Span:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.name, time.time() - self.start)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.spans = {}  # name -> [count, total seconds, longest seconds]
+            self.counters = {}
+
+    def span(self, name):
+        # time a "with" block as one run of the stage "name"
+        return Span(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        # returns a dictionary of everything recorded since the last reset(), ready for json
+        with self.lock:
+            return {
+                'started': self.started,
+                'seconds': round(time.time() - self.started, 3),
+                'spans': dict((name, {'count': count, 'seconds': round(total, 3), 'longest': round(longest, 3)})
+                              for name, (count, total, longest) in self.spans.items()),
+                'counters': dict(self.counters),
+            }
+
+
+def summary_lines(summary):
+    # a summary() as lines for the log, spans slowest first
+    counters = summary['counters']
+    statuses = sorted((name.split('.')[-1], count) for name, count in counters.items()
+                      if name.startswith('http.status.'))
+    lines = ["%.1fs, %s requests (%s), %.1f MB, %s retries, %s files written, %s unchanged" % (
+        summary['seconds'], counters.get('http.requests', 0),
+        ', '.join('%s: %s' % status for status in statuses) or 'none',
+        counters.get('http.bytes', 0) / 1048576.0, counters.get('http.retries', 0),
+        counters.get('files.written', 0), counters.get('files.unchanged', 0))]
+    for name, span in sorted(summary['spans'].items(), key=lambda item: -item[1]['seconds']):
+        lines.append("  %-20s %6d x %9.3fs total %8.1fms mean %8.1fms longest" % (
+            name, span['count'], span['seconds'], 1000.0 * span['seconds'] / span['count'], 1000.0 * span['longest']))
+    return lines
+
+
+class Profiler:
+    # cProfile stats from every thread, as a cProfile.Profile only sees the thread that enabled it
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.profiles = []
+
+    def wrap(self, func):
+        # returns func profiled in whichever thread calls it, calls must not nest within a thread
+        import cProfile
+
+        def profiled(*args, **kwargs):
+            profile = getattr(self.local, 'profile', None)
+            if profile is None:
+                profile = self.local.profile = cProfile.Profile()
+                with self.lock:
+                    self.profiles.append(profile)
+            try:
+                profile.enable()
+            except ValueError:
+                # python 3.12 on only lets one profile be enabled at a time, other threads then go unprofiled
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def dump(self, path):
+        # write the stats of every thread to path, for pstats or snakeviz
+        import pstats
+
+        with self.lock:
+            if self.profiles:
+                pstats.Stats(*self.profiles).dump_stats(path)
+
+
+def kodi_log(message, level=INFO):
+    # a Config log function that writes to kodi's own log at the matching level
+    # - only usable inside kodi, every other part of the engine stays free of kodi modules
+    import xbmc
+
+    if sys.version_info[0] < 3 and not isinstance(message, str):
+        message = message.encode('utf-8')
+    kodi_level = [xbmc.LOGDEBUG, xbmc.LOGINFO, xbmc.LOGWARNING, xbmc.LOGERROR][level]
+    xbmc.log('[plugin.video.yourtube] ' + message, kodi_level)
@@ -0,0 +1,85 @@
+# token bucket pacing of every request made to youtube
+# - a request waits for a token, tokens come back at "rate" per second up to "burst"
+# - waiting requests are served by priority, then in the order they arrived,
+#   so interactive views jump ahead of background sync traffic
+# - a 429 or 503 halves the rate and holds every request back for its Retry-After,
+#   each successful request after that wins back a little of the rate
+
+import heapq
+import itertools
+import threading
+import time
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class RateLimiter:
+    def __init__(self, rate=10.0, burst=None, min_rate=0.5, recovery=0.05, defer=None):
+        # - rate: requests per second at most
+        # - burst: requests that may be made at once after an idle spell, defaults to one second's worth
+        # - min_rate: slowing down never goes below this many requests per second
+        # - recovery: fraction of "rate" each successful request wins back after slowing down
+        # - defer: optional function returning True while background requests should hold back,
+        #   e.g. while the plugin serves a view from another interpreter
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.burst = max(1.0, float(burst or rate))
+        self.recovery = recovery
+        self.defer = defer
+        self.tokens = self.burst
+        self.stamp = time.time()
+        self.paused_until = 0.0
+        self.slowed = 0.0
+        self.waiting = []  # heap of (priority, arrival) of the requests waiting for a token
+        self.arrivals = itertools.count()
+        self.cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def acquire(self, priority=BACKGROUND):
+        # block until a request of the given priority may be made
+        with self.cond:
+            ticket = (priority, next(self.arrivals))
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    now = time.time()
+                    self._refill(now)
+                    wait = None  # not first in line, wait to be woken by the one that is
+                    if self.waiting[0] == ticket:
+                        if priority != INTERACTIVE and self.defer and self.defer():
+                            wait = 0.5
+                        elif now < self.paused_until:
+                            wait = self.paused_until - now
+                        elif self.tokens >= 1:
+                            self.tokens -= 1
+                            return
+                        else:
+                            wait = (1 - self.tokens) / self.rate
+                    self.cond.wait(wait)
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.cond.notify_all()
+
+    def throttled(self, retry_after=None):
+        # slow down after youtube answered 429 or 503
+        # - requests that were already in flight when the first one was refused do not slow it down further
+        with self.cond:
+            now = time.time()
+            if now - self.slowed >= 1.0 / self.rate:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.slowed = now
+            self.tokens = min(self.tokens, 0)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self.paused_until = max(self.paused_until, now + pause)
+            self.cond.notify_all()
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self.cond:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
@@ -0,0 +1,56 @@
+# on-disk cache of parsed results for the plugin's views: channel about info, upload lists and video info
+# - each result is stored once as compressed json, keyed by its kind and e.g. its channel or video id
+# - results are kept past their time to live, it is up to the caller whether a stale one will do
+# - the least recently used results are evicted once the cache holds more than "max_bytes"
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ResultCache:
+    def __init__(self, path, max_bytes=20 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(kind TEXT, key TEXT, value BLOB, size INTEGER, stored REAL, used REAL, PRIMARY KEY (kind, key))")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            self.conn.commit()
+
+    def get(self, kind, key):
+        # returns (value, age in seconds) or None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, stored FROM results WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE results SET used = ? WHERE kind = ? AND key = ?", (time.time(), kind, key))
+            self.conn.commit()
+        return json.loads(zlib.decompress(bytes(row[0])).decode('utf-8')), time.time() - row[1]
+
+    def put(self, kind, key, value):
+        blob = zlib.compress(json.dumps(value).encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                              (kind, key, sqlite3.Binary(blob), len(blob), now, now))
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        # drop the least recently used results until the rest fit in max_bytes, called with the lock held
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for kind, key, size in self.conn.execute("SELECT kind, key, size FROM results ORDER BY used"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((kind, key))
+            total -= size
+        self.conn.executemany("DELETE FROM results WHERE kind = ? AND key = ?", evicted)
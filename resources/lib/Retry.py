@@ -0,0 +1,104 @@
+# bounded retries with jittered exponential backoff
+# - a CircuitBreaker shared by several policies stops all requests for a while once too many fail in a row
+
+import random
+import threading
+import time
+
+
+class RetryError(Exception):
+    # raised once every attempt failed, carries the last exception raised
+    def __init__(self, attempts, error):
+        Exception.__init__(self, "gave up after %s attempts: %r" % (attempts, error))
+        self.attempts = attempts
+        self.error = error
+
+
+class CircuitOpen(Exception):
+    # raised instead of making a request while the circuit breaker is open
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=20, cooldown=60.0, log=None):
+        # opens after "threshold" consecutive failures and stays open for "cooldown" seconds
+        # - log: optional function of a message and its level, told whenever the circuit opens
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.log = log
+        self.failures = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        # returns True if a request may be made
+        # - once the cooldown has passed requests are allowed again, a single failure re-opens the circuit
+        with self.lock:
+            if self.opened is None:
+                return True
+            if time.time() - self.opened >= self.cooldown:
+                self.opened = None
+                self.failures = self.threshold - 1
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened is None:
+                if self.log:
+                    from resources.lib.Metrics import WARNING
+                    self.log("circuit breaker opened after %s failures in a row" % self.failures, WARNING)
+                self.opened = time.time()
+
+
+class RetryPolicy:
+    def __init__(self, attempts=4, base_delay=1.0, max_delay=30.0, breaker=None, giveup=None, metrics=None):
+        # - attempts: maximum number of calls, including the first one
+        # - base_delay / max_delay: bounds in seconds of the exponential backoff between attempts
+        # - breaker: optional CircuitBreaker, shared by everything that talks to the same server
+        # - giveup: optional function of an exception returning True if retrying it is pointless
+        # - metrics: optional Metrics counting 'http.retries' and 'http.giveups'
+        self.attempts = max(1, int(attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker
+        self.giveup = giveup
+        self.metrics = metrics
+
+    def delay(self, attempt):
+        # "full jitter" backoff, so threads that failed together do not retry together
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, func, *args, **kwargs):
+        # call func until it returns without raising
+        # - raises RetryError after self.attempts failures, or CircuitOpen if the breaker is open
+        for attempt in range(self.attempts):
+            if self.breaker and not self.breaker.allow():
+                raise CircuitOpen()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if self.giveup and self.giveup(e):
+                    # e.g. a removed video, youtube answered, so it does not count against the breaker
+                    if self.metrics:
+                        self.metrics.count('http.giveups')
+                    raise RetryError(attempt + 1, e)
+                if self.breaker:
+                    self.breaker.record_failure()
+                error = e
+            else:
+                if self.breaker:
+                    self.breaker.record_success()
+                return result
+            if attempt + 1 < self.attempts:
+                if self.metrics:
+                    self.metrics.count('http.retries')
+                time.sleep(self.delay(attempt))
+        if self.metrics:
+            self.metrics.count('http.giveups')
+        raise RetryError(self.attempts, error)
@@ -0,0 +1,221 @@
+# rules deciding which videos go into which show, and their compiler
+# - a rule is a postfix string such as "channel,UCxxx,IS,title,#shorts,CONTAINS,AND", as built by the rule builder
+#   - IS / IS NOT compare a field with a value exactly
+#   - CONTAINS / DOES NOT CONTAIN look for a value anywhere in a field, ignoring case
+#   - MATCHES / DOES NOT MATCH search a field with a regular expression
+#   - AND / OR combine two rules
+# - fields are 'channel' (its channel_id), 'title' and 'description' of a video
+# - rules are compiled once into a single python function, so evaluating them for a video is one call
+#   with no walking of the tree, matchers are prepared up front and AND / OR short-circuit with the cheapest
+#   tests first, and a channel's own rules are folded away entirely when routing its uploads (see Router)
+
+import re
+
+MATCHERS = ('IS', 'IS NOT', 'CONTAINS', 'DOES NOT CONTAIN', 'MATCHES', 'DOES NOT MATCH')
+JUNCTIONS = ('AND', 'OR')
+FIELDS = {'channel': 'channel_id', 'title': 'title', 'description': 'plot'}  # rule field -> upload info key
+
+
+class ruleTree:
+    def __init__(self, cargo, left=None, right=None):
+        self.cargo = cargo
+        self.left = left
+        self.right = right
+
+
+def rules_from_string(rules_str):
+    # builds a ruleTree from a postfix string, or a list of its tokens where a value holds a comma
+    rule_list = rules_str if isinstance(rules_str, (list, tuple)) else rules_str.split(',')
+    stack = []
+    for rule in rule_list:
+        node = ruleTree(rule)
+        if node.cargo in MATCHERS + JUNCTIONS:
+            if len(stack) < 2:
+                raise ValueError("%s is missing an operand in rule %r" % (rule, rules_str))
+            node.right = stack.pop()
+            node.left = stack.pop()
+        stack.append(node)
+    if len(stack) != 1:
+        raise ValueError("rule %r does not reduce to a single rule" % (rules_str,))
+    return stack[0]
+
+
+def rules_to_string(tree, rules_str=None):
+    # returns the postfix string from a ruleTree
+    if tree.left:
+        rules_str = rules_to_string(tree.left, rules_str)
+    if tree.right:
+        rules_str = rules_to_string(tree.right, rules_str)
+    if rules_str is not None:
+        return rules_str + ',' + str(tree.cargo)
+    else:
+        return str(tree.cargo)
+
+
+class Compiler:
+    # turns ruleTrees into python source over the fields of an upload info dictionary "r"
+    # - fixed: dictionary of rule field -> value known for every video the source will see,
+    #   tests of those fields are decided here and never make it into the source
+    # - an expression is True or False when it was decided, otherwise (cost, source)
+    def __init__(self, fixed=None):
+        self.fixed = fixed or {}
+        self.constants = {}  # name in the source -> prepared matcher or value
+        self.fields = set()  # fields the source reads as is
+        self.lowered = set()  # fields the source reads in lower case
+
+    def constant(self, value):
+        name = 'k%d' % len(self.constants)
+        self.constants[name] = value
+        return name
+
+    def field(self, field, lowered=False):
+        (self.lowered if lowered else self.fields).add(field)
+        return ('l_' if lowered else 'f_') + field
+
+    def expression(self, node):
+        if node.cargo in JUNCTIONS:
+            return self.junction(node.cargo, self.flatten(node.cargo, node, []))
+        if node.cargo not in MATCHERS:
+            raise ValueError("%r is not a rule" % node.cargo)
+        return self.test(node.cargo, node.left, node.right)
+
+    def flatten(self, op, node, operands):
+        # the operands of a chain of the same junction, e.g. a OR (b OR c) -> [a, b, c]
+        for child in (node.left, node.right):
+            if child.cargo == op:
+                self.flatten(op, child, operands)
+            else:
+                operands.append(child)
+        return operands
+
+    def test(self, op, field, value):
+        if field.left or value.left or field.cargo not in FIELDS:
+            raise ValueError("%s needs a field (one of %s) and a value" % (op, ', '.join(sorted(FIELDS))))
+        field, value = field.cargo, value.cargo
+        negate = op in ('IS NOT', 'DOES NOT CONTAIN', 'DOES NOT MATCH')
+        if op in ('IS', 'IS NOT'):
+            return self.equals(field, set([value]), negate)
+        if op in ('CONTAINS', 'DOES NOT CONTAIN'):
+            if field in self.fixed:
+                return (value.lower() in self.fixed[field].lower()) != negate
+            source = '%s in %s' % (self.constant(value.lower()), self.field(field, lowered=True))
+            return 2, ('not ' if negate else '') + source
+        try:
+            search = re.compile(value).search
+        except re.error as e:
+            raise ValueError("%r is not a regular expression: %s" % (value, e))
+        if field in self.fixed:
+            return (search(self.fixed[field]) is not None) != negate
+        return 3, '%s%s(%s)' % ('not ' if negate else '', self.constant(search), self.field(field))
+
+    def equals(self, field, values, negate):
+        # a field being one of several values is a single lookup in a set
+        if field in self.fixed:
+            return (self.fixed[field] in values) != negate
+        if len(values) == 1:
+            source = '%s %s %s' % (self.field(field), '!=' if negate else '==', self.constant(list(values)[0]))
+        else:
+            source = '%s %s %s' % (self.field(field), 'not in' if negate else 'in', self.constant(frozenset(values)))
+        return 1, source
+
+    def junction(self, op, operands):
+        # - tests of the same field for equality are merged into one set lookup,
+        #   values a field IS in an OR, or IS NOT in an AND
+        # - decided operands either decide the whole junction or drop out of it
+        # - the rest are tested cheapest first, which is safe as tests have no side effects
+        merge = 'IS' if op == 'OR' else 'IS NOT'
+        merged = {}
+        expressions = []
+        for operand in operands:
+            if operand.cargo == merge and not operand.left.left and operand.left.cargo in FIELDS \
+                    and not operand.right.left:
+                merged.setdefault(operand.left.cargo, set()).add(operand.right.cargo)
+            else:
+                expressions.append(self.expression(operand))
+        for field in sorted(merged):
+            expressions.append(self.equals(field, merged[field], op == 'AND'))
+
+        decisive = op == 'OR'  # True decides an OR, False decides an AND
+        undecided = []
+        for expression in expressions:
+            if expression is decisive:
+                return decisive
+            if expression is not (not decisive):
+                undecided.append(expression)
+        if not undecided:
+            return not decisive
+        if len(undecided) == 1:
+            return undecided[0]
+        undecided.sort(key=lambda expression: expression[0])
+        return (sum(cost for cost, source in undecided),
+                '(' + (' %s ' % op.lower()).join(source for cost, source in undecided) + ')')
+
+    def function(self, name, body):
+        # returns the python function "name"(r) made from lines of body,
+        # preceded by reading the fields the body uses into locals
+        lines = ['def %s(r):' % name]
+        for field in sorted(self.fields | self.lowered):
+            lines.append("    f_%s = r.get('%s') or u''" % (field, FIELDS[field]))
+        for field in sorted(self.lowered):
+            lines.append("    l_%s = f_%s.lower()" % (field, field))
+        namespace = dict(self.constants)
+        exec('\n'.join(lines + ['    ' + line for line in body]), namespace)
+        return namespace[name]
+
+
+def compile_rules(rules, fixed=None):
+    # returns a function of an upload info dictionary returning True if the video matches rules
+    # - rules: a postfix string, a list of its tokens or a ruleTree
+    # - fixed: dictionary of rule field -> value known for every video it will be called with
+    compiler = Compiler(fixed)
+    expression = compiler.expression(rules if isinstance(rules, ruleTree) else rules_from_string(rules))
+    if expression is True or expression is False:
+        return lambda r, decided=expression: decided
+    return compiler.function('match', ['return ' + expression[1]])
+
+
+class Router:
+    # decides which show each video goes into
+    # - shows: list of (show title, rules) in order, a video goes into the first show whose rules it matches
+    #   and into its channel's own show if it matches none
+    # - rules are checked once up front, so a mistake in them shows before any video is fetched
+    def __init__(self, shows):
+        self.shows = [(title, rules_from_string(rules) if not isinstance(rules, ruleTree) else rules)
+                      for title, rules in shows]
+        self.channels = {}  # channel_id -> (show index every upload goes to, or a function of an upload)
+        for title, tree in self.shows:
+            Compiler().expression(tree)
+
+    def for_channel(self, channel_id):
+        # routing of one channel's uploads, with the channel's rules folded in
+        # - returns (index, None) if every upload goes to the same show, -1 being the channel's own,
+        #   otherwise (None, function of an upload info dictionary returning the index of its show)
+        if channel_id not in self.channels:
+            compiler = Compiler({'channel': channel_id})
+            body = []
+            for index, (title, tree) in enumerate(self.shows):
+                expression = compiler.expression(tree)
+                if expression is False:
+                    continue
+                if expression is True:
+                    if not body:
+                        self.channels[channel_id] = (index, None)
+                        return self.channels[channel_id]
+                    body.append('return %d' % index)
+                    break
+                body.append('if %s: return %d' % (expression[1], index))
+            else:
+                if not body:
+                    self.channels[channel_id] = (-1, None)
+                    return self.channels[channel_id]
+                body.append('return -1')
+            self.channels[channel_id] = (None, compiler.function('route', body))
+        return self.channels[channel_id]
+
+    def route(self, channel_id, uploads):
+        # returns the show title for each of a channel's uploads, None for the channel's own show
+        index, route = self.for_channel(channel_id)
+        titles = [title for title, tree in self.shows] + [None]  # index -1 is the channel's own show
+        if route is None:
+            return [titles[index]] * len(uploads)
+        return [titles[route(upload)] for upload in uploads]
@@ -1,23 +1,101 @@
+# logged in session with google, for downloads that need the user's account such as the subscriptions takeout
 # code from: http://stackoverflow.com/questions/6754709/logging-in-to-google-using-python
+# - logs in lazily: only once a request has no cookies to go on, or comes back showing the session is invalid
+# - with a cookie_path, the cookie jar is saved there after every request and picked up again by the next
+#   SessionGoogle, so a new process goes on with the last session instead of logging in again,
+#   cookies past their expiry are dropped as the jar is loaded
+# - credentials is a function returning (login, password), only called when it has to log in
+
+import os
+import time
+
+try:
+    from http.cookiejar import LoadError, LWPCookieJar
+except ImportError:
+    from cookielib import LoadError, LWPCookieJar
+
+url_login = "https://accounts.google.com/ServiceLogin"
+url_auth = "https://accounts.google.com/ServiceLoginAuth"
+
+
+class LoginError(Exception):
+    # raised when a request still finds itself logged out right after logging in
+    pass
+
+
+def logged_out(response):
+    # returns True if response shows the session is not (or no longer) logged in
+    # - google sends a logged out request on to its login page
+    return response.status_code in (401, 403) or response.url.startswith(url_login)
+
 
 class SessionGoogle:
-    def __init__(self, login, pwd):
+    def __init__(self, credentials, cookie_path=None, timeout=30, metrics=None):
+        # - credentials: function returning (login, password)
+        # - cookie_path: optional file the cookie jar is kept in, it holds the session so only its owner may read it
+        # - metrics: optional Metrics that times logging in as 'login' and counts 'google.logins'
         import requests
-        from bs4 import BeautifulSoup
+
+        self.credentials = credentials
+        self.cookie_path = cookie_path
+        self.timeout = timeout
+        self.metrics = metrics
         self.ses = requests.session()
-        url_login = "https://accounts.google.com/ServiceLogin"
-        url_auth = "https://accounts.google.com/ServiceLoginAuth"
-        login_html = self.ses.get(url_login)
-        soup_login = BeautifulSoup(login_html.content, 'html.parser').find('form').find_all('input')
-        my_dict = {}
-        for u in soup_login:
-            if u.has_attr('value'):
-                my_dict[u['name']] = u['value']
+        if cookie_path and os.path.exists(cookie_path):
+            jar = LWPCookieJar(cookie_path)
+            try:
+                jar.load(ignore_discard=True)
+            except (IOError, OSError, LoadError):
+                pass
+            else:
+                self.ses.cookies.update(jar)
+
+    def login(self):
+        # log in from scratch, posting the credentials along with the hidden fields of google's login form
+        from resources.lib.Extract import extract_form
+
+        login, pwd = self.credentials()
+        start = time.time()
+        self.ses.cookies.clear()
+        login_html = self.ses.get(url_login, timeout=self.timeout)
+        my_dict = extract_form(login_html.text)
         # override the inputs without login and pwd:
         my_dict['Email'] = login
         my_dict['Passwd'] = pwd
-        self.ses.post(url_auth, data=my_dict)
+        self.ses.post(url_auth, data=my_dict, timeout=self.timeout)
+        if self.metrics:
+            self.metrics.record('login', time.time() - start)
+            self.metrics.count('google.logins')
 
-    def get(self, URL):
-        return self.ses.get(URL).text
+    def save(self):
+        # write the cookie jar to cookie_path, through a temporary file only its owner may read
+        from resources.lib.LibraryWriter import replace
+
+        if not self.cookie_path:
+            return
+        jar = LWPCookieJar()
+        for cookie in self.ses.cookies:
+            jar.set_cookie(cookie)
+        tmp = self.cookie_path + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT, 0o600))
+        jar.save(tmp, ignore_discard=True)
+        replace(tmp, self.cookie_path)
 
+    def get(self, URL):
+        # returns the text of URL fetched as the logged in user
+        # - logs in first if there are no cookies, and once more if the response shows the session is invalid
+        # - raises LoginError if it is still logged out after that, or requests.HTTPError for error statuses
+        fresh = not len(self.ses.cookies)
+        if fresh:
+            self.login()
+        r = self.ses.get(URL, timeout=self.timeout)
+        if logged_out(r) and not fresh:
+            self.login()
+            r = self.ses.get(URL, timeout=self.timeout)
+        if logged_out(r):
+            raise LoginError("not logged in to google after logging in as the given user")
+        r.raise_for_status()
+        self.save()
+        return r.text
@@ -0,0 +1,42 @@
+# the subscriptions as the plugin lists them, precomputed
+# - written by the engine whenever its snapshot of the subscriptions changes
+# - read by the plugin straight from disk, so listing subscriptions needs neither the metadata store
+#   nor the takeout parser, only json
+# - whoever reads it decides whether the takeout it was made from is still fresh enough, see takeout_stale()
+
+import json
+import os
+import time
+
+
+def index_path(data):
+    return os.path.join(data, 'subscriptions.json')
+
+
+def takeout_stale(data, ttl):
+    # returns True if "subscriptions.rss" is missing or was downloaded over "ttl" seconds ago
+    fname = os.path.join(data, 'subscriptions.rss')
+    return not os.path.isfile(fname) or time.time() - os.path.getmtime(fname) > ttl
+
+
+def write_index(data, subs):
+    # save a list of dictionaries of 'channel_id' and 'title', in the order they are listed
+    # - written to a temporary file first, so the plugin never reads half an index
+    from resources.lib.LibraryWriter import replace
+
+    path = index_path(data)
+    with open(path + '.tmp', 'w') as f:
+        json.dump([[sub['channel_id'], sub['title']] for sub in subs], f, separators=(',', ':'))
+    replace(path + '.tmp', path)
+
+
+def read_index(data, ttl):
+    # returns the list of dictionaries of 'channel_id' and 'title' last written,
+    # or None if there is no index or the takeout it was made from is stale
+    if takeout_stale(data, ttl):
+        return None
+    try:
+        with open(index_path(data), 'r') as f:
+            return [{'channel_id': channel_id, 'title': title} for channel_id, title in json.load(f)]
+    except (IOError, OSError, ValueError):
+        return None
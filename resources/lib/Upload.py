@@ -0,0 +1,58 @@
+# compact record of one upload, as listed and synced by the engine
+# - a channel with tens of thousands of uploads holds as many of these at once during a sync,
+#   so fields live in __slots__ rather than a dictionary per upload, and 'thumb' is derived from the video_id
+#   whenever it is read instead of being stored as a string of its own
+# - reads like the upload info dictionaries it replaced: upload['title'], upload.get('plot'), 'aired' in upload,
+#   sorted(upload) for its keys and dict(upload) for a plain dictionary, e.g. for json
+# - a field that was never set, or was given as None when the record was made, is missing, just as its key would be
+
+FIELDS = ('video_id', 'title', 'aired', 'runtime', 'plot', 'season', 'episode')
+KEYS = frozenset(FIELDS + ('thumb',))
+
+
+class Upload(object):
+    __slots__ = FIELDS
+
+    def __init__(self, video_id, **info):
+        self.video_id = video_id
+        for key in info:
+            if info[key] is not None:
+                setattr(self, key, info[key])
+
+    @property
+    def thumb(self):
+        return "https://i.ytimg.com/vi/" + self.video_id + "/hqdefault.jpg"
+
+    def __getitem__(self, key):
+        if key in KEYS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in KEYS and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in FIELDS if hasattr(self, key)] + ['thumb']
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return 'Upload(%s)' % ', '.join('%s=%r' % (key, self[key]) for key in self.keys() if key != 'thumb')
@@ -0,0 +1,62 @@
+# which channel every video belongs to, consulted by a sync before it fetches anything
+# - the metadata store keeps every video synced keyed by its video_id, so it is the index on disk
+# - videos claimed by the channels of a sync in progress are kept in memory until they are stored,
+#   so two channels listing the same video at once never both write it
+# - a video stored before belongs to the channel it was stored for, a new one listed by several channels
+#   of a sync belongs to the first of them in the sync's order, however the channels' fetches interleave:
+#   a channel may take back a video a later channel claimed first, and a channel's videos are only its own
+#   for certain once every channel before it has settled, see decided()
+
+import threading
+
+
+class VideoIndex:
+    def __init__(self, database, channel_ids=()):
+        # - channel_ids: the channels of the sync in order, a channel not among them comes after all of them
+        self.database = database
+        self.lock = threading.Lock()
+        self.order = list(channel_ids)
+        self.rank = dict((channel_id, n) for n, channel_id in enumerate(self.order))
+        self.claimed = {}  # video_id -> channel_id, for the videos claimed since the index was made
+        self.settled = set()  # channels that will not claim any more videos
+        self.ahead = 0  # number of channels at the start of order that have all settled
+
+    def claim(self, channel_id, video_ids):
+        # returns the video_ids channel_id may fetch, in order, claiming those no channel before it has
+        # - those stored for another channel, or claimed by a channel before it, are left out
+        # - settles channel_id, a channel claims once per sync
+        stored = self.database.video_channels(video_ids)
+        rank = self.rank.get(channel_id, len(self.order))
+        claimed = []
+        with self.lock:
+            for video_id in video_ids:
+                owner = stored.get(video_id)
+                if owner is None:
+                    owner = self.claimed.get(video_id)
+                    if owner is None or self.rank.get(owner, len(self.order)) > rank:
+                        owner = self.claimed[video_id] = channel_id
+                if owner == channel_id:
+                    claimed.append(video_id)
+            self.advance(channel_id)
+        return claimed
+
+    def settle(self, channel_id):
+        # channel_id will not claim any videos in this sync, e.g. as it failed before listing its uploads
+        with self.lock:
+            self.advance(channel_id)
+
+    def advance(self, channel_id):
+        # settle channel_id, called with the lock held
+        self.settled.add(channel_id)
+        while self.ahead < len(self.order) and self.order[self.ahead] in self.settled:
+            self.ahead += 1
+
+    def decided(self, channel_id):
+        # returns True once every channel before channel_id has settled, so no video can be taken from it any more
+        with self.lock:
+            return self.rank.get(channel_id, len(self.order)) <= self.ahead
+
+    def keep(self, channel_id, uploads):
+        # returns those of uploads, records of videos channel_id claimed, that a channel before it did not take back
+        with self.lock:
+            return [upload for upload in uploads if self.claimed.get(upload.video_id, channel_id) == channel_id]
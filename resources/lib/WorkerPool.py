@@ -0,0 +1,64 @@
+# persistent pool of worker threads fed from one shared queue
+# - an idle worker takes the next task as soon as it is free, so a slow task only occupies its own worker
+# - results are handed back to the caller in the order they finish
+
+import threading
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+
+class WorkerPool:
+    def __init__(self, size):
+        self.size = max(1, int(size))
+        self.tasks = Queue()
+        self.threads = []
+        for i in range(self.size):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            func, index, item, results = task
+            try:
+                results.put((index, func(item), None))
+            except Exception as e:
+                results.put((index, None, e))
+
+    def imap_unordered(self, func, items):
+        # run func on every item of items
+        # - yields (index, result, error) tuples as they finish, where index is the item's position in items
+        #   and error is the exception func raised or None
+        # - several callers may share one pool at the same time
+        results = Queue()
+        count = 0
+        for index, item in enumerate(items):
+            self.tasks.put((func, index, item, results))
+            count += 1
+        for i in range(count):
+            yield results.get()
+
+    def map(self, func, items):
+        # run func on every item of items and return a list of results in the order of items
+        # - the first exception raised by func is re-raised once all items are done
+        items = list(items)
+        mapped = [None] * len(items)
+        error = None
+        for index, result, e in self.imap_unordered(func, items):
+            mapped[index] = result
+            error = error or e
+        if error is not None:
+            raise error
+        return mapped
+
+    def close(self):
+        # let the workers exit once the tasks already queued are done
+        for thread in self.threads:
+            self.tasks.put(None)
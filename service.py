@@ -0,0 +1,124 @@
+# background service that syncs subscriptions into the library, so nobody waits on a sync in the plugin
+# - a pass over every subscription starts every "service_interval" hours once kodi has been idle for
+#   "service_idle" minutes and nothing is playing, or straight away when the plugin asks for one
+# - a pass runs as steps of at most "service_slice" minutes, each stepping aside once kodi is no longer idle,
+#   and the next step picks up the channels the previous ones did not get to
+# - kodi shutting down stops a step straight away, dropping the channels it was in the middle of
+# - a step whose sync fails leaves its pass unfinished, to be stepped again "retry_delay" seconds later
+# - the library is updated once at the end of a pass, for the show folder that changed or the whole TV folder
+import os
+import time
+import xbmc
+import xbmcaddon
+import xbmcgui
+
+from resources.lib.Engine import Config, Engine
+from resources.lib.Metrics import ERROR, kodi_log
+
+addon_id = 'plugin.video.yourtube'
+plugin_quiet = 10  # seconds background requests hold back after the plugin last served a view
+retry_delay = 60  # seconds before a pass whose last step failed is stepped again
+
+
+def plugin_busy():
+    # the plugin marks the home window whenever it starts serving a view that needs youtube
+    marked = xbmcgui.Window(10000).getProperty('yourtube.interactive')
+    return time.time() - float(marked or 0) < plugin_quiet
+
+
+class SyncService(xbmc.Monitor):
+    def __init__(self):
+        xbmc.Monitor.__init__(self)
+        self.addon = xbmcaddon.Addon(addon_id)
+        self.data = xbmc.translatePath(self.addon.getAddonInfo('profile'))
+        self.config = Config(self.data, self.addon.getSetting, log=kodi_log, defer=plugin_busy)
+        self.engine = Engine(self.config)
+        self.requested = None  # force flag of a pass the plugin asked for, None if it did not
+        self.started = None  # time.time() the current pass started, None between passes
+        self.resume = 0  # time.time() the current pass may be stepped again after a failed step
+        self.force = False
+        self.interactive = False
+        self.folders = set()
+
+    def onSettingsChanged(self):
+        # older versions of kodi only see changed settings through a new Addon
+        self.addon = xbmcaddon.Addon(addon_id)
+        self.config.settings = self.addon.getSetting
+
+    def onNotification(self, sender, method, data):
+        # the plugin asks for a pass with NotifyAll(plugin.video.yourtube,sync) or sync_force
+        if sender == addon_id and method in ('Other.sync', 'Other.sync_force'):
+            self.requested = method == 'Other.sync_force'
+
+    def idle(self):
+        return xbmc.getGlobalIdleTime() >= float(self.config.get('service_idle', 5)) * 60 and \
+            not xbmc.Player().isPlaying()
+
+    def due(self):
+        last = float(self.engine.database().get_state('service_last_pass') or 0)
+        return time.time() - last >= float(self.config.get('service_interval', 6)) * 3600
+
+    def begin(self, force, interactive):
+        self.started = time.time()
+        self.force = force
+        self.interactive = interactive
+        self.folders = set()
+
+    def step(self):
+        # run one slice of the current pass, and finish the pass if every channel was got to
+        deadline = time.time() + float(self.config.get('service_slice', 5)) * 60
+
+        def should_stop():
+            return time.time() >= deadline or not (self.interactive or self.idle())
+
+        dialog = None
+        if self.interactive or self.config.flag('service_progress'):
+            dialog = xbmcgui.DialogProgressBG()
+            dialog.create('YourTube', 'Syncing subscriptions')
+
+        def progress(done, total, title):
+            if dialog:
+                dialog.update(int(100 * done / max(total, 1)), message=title)
+
+        try:
+            summary = self.engine.sync(force=self.force, started=self.started, should_stop=should_stop,
+                                       should_abort=self.abortRequested, progress=progress)
+        except Exception as e:
+            # most likely the subscriptions could not be fetched, the pass is not over until a step gets through
+            self.engine.log("background sync failed: %r" % e, ERROR)
+            self.resume = time.time() + retry_delay
+            return
+        finally:
+            if dialog:
+                dialog.close()
+
+        self.folders.update(summary['folders'])
+        if summary['skipped'] == 0 and not self.abortRequested():
+            self.finish()
+
+    def finish(self):
+        self.engine.database().set_state('service_last_pass', str(time.time()))
+        if self.folders:
+            # one scan of what changed instead of one per channel, kodi wants a trailing separator on folders
+            folder = self.folders.pop() if len(self.folders) == 1 else 'TV'
+            xbmc.executebuiltin('UpdateLibrary(video,%s)' % os.path.join(self.data, *(folder.split('/') + [''])))
+        self.started = None
+        self.folders = set()
+
+    def run(self):
+        while not self.abortRequested():
+            if self.started is None:
+                if self.requested is not None:
+                    self.begin(self.requested, interactive=True)
+                    self.requested = None
+                elif self.config.flag('service_enabled') and self.due() and self.idle():
+                    self.begin(False, interactive=False)
+            if self.started is not None and time.time() >= self.resume and (self.interactive or self.idle()):
+                self.step()
+            if self.waitForAbort(1 if self.started is not None else 10):
+                break
+        self.engine.close()
+
+
+if __name__ == '__main__':
+    SyncService().run()
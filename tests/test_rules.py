@@ -0,0 +1,160 @@
+# behaviour of the show rules in resources/lib/Rules.py: every test and its negation, junctions folded with a
+# channel known up front, and rules that make no sense being turned down
+#
+# usage: python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resources.lib.Rules import Router, compile_rules, rules_from_string, rules_to_string  # noqa: E402
+
+VIDEO = {'channel_id': 'UCa', 'title': u'Primes #Shorts part 2', 'plot': u'The Riemann hypothesis, briefly'}
+
+
+class OperatorTest(unittest.TestCase):
+    def check(self, rules, matching, other):
+        # rules match the video of fields matching and not the one of other, compiled and folded both ways
+        for upload, expected in ((matching, True), (other, False)):
+            video = dict(VIDEO, **upload)
+            self.assertEqual(bool(compile_rules(rules)(video)), expected, (rules, upload))
+            if 'channel_id' in upload:
+                # decided up front with the channel fixed, the same as tested for every video
+                fixed = compile_rules(rules, fixed={'channel': upload['channel_id']})
+                self.assertEqual(bool(fixed(video)), expected, (rules, upload))
+
+    def test_is(self):
+        self.check('channel,UCa,IS', {'channel_id': 'UCa'}, {'channel_id': 'UCab'})
+        self.check('title,Primes,IS', {'title': u'Primes'}, {'title': u'primes'})
+
+    def test_is_not(self):
+        self.check('channel,UCa,IS NOT', {'channel_id': 'UCb'}, {'channel_id': 'UCa'})
+        self.check('title,Primes,IS NOT', {'title': u'primes'}, {'title': u'Primes'})
+
+    def test_contains(self):
+        self.check('title,#shorts,CONTAINS', {'title': u'Primes #SHORTS'}, {'title': u'Primes'})
+        self.check('description,riemann,CONTAINS', {'plot': u'About Riemann'}, {'plot': u'About primes'})
+        self.check('channel,ucA,CONTAINS', {'channel_id': 'UCab'}, {'channel_id': 'UCb'})
+
+    def test_does_not_contain(self):
+        self.check('title,#shorts,DOES NOT CONTAIN', {'title': u'Primes'}, {'title': u'Primes #SHORTS'})
+        self.check('channel,ucA,DOES NOT CONTAIN', {'channel_id': 'UCb'}, {'channel_id': 'UCab'})
+
+    def test_matches(self):
+        # searched for anywhere in the field, and case matters
+        self.check(['title', r'part \d+', 'MATCHES'], {'title': u'Primes part 12'}, {'title': u'Primes Part 12'})
+        self.check(['channel', '^UCa$', 'MATCHES'], {'channel_id': 'UCa'}, {'channel_id': 'UCab'})
+
+    def test_does_not_match(self):
+        self.check(['title', r'part \d+', 'DOES NOT MATCH'], {'title': u'Primes'}, {'title': u'Primes part 2'})
+        self.check(['channel', '^UCa$', 'DOES NOT MATCH'], {'channel_id': 'UCab'}, {'channel_id': 'UCa'})
+
+    def test_missing_field(self):
+        # a video without a description has an empty one
+        video = {'channel_id': 'UCa', 'title': u'Primes'}
+        self.assertFalse(compile_rules('description,riemann,CONTAINS')(video))
+        self.assertTrue(compile_rules('description,riemann,DOES NOT CONTAIN')(video))
+        self.assertTrue(compile_rules(['description', '^$', 'MATCHES'])(video))
+
+    def test_value_with_a_comma(self):
+        rules = ['title', u'primes, briefly', 'CONTAINS']
+        self.assertTrue(compile_rules(rules)(dict(VIDEO, title=u'Primes, briefly')))
+        self.assertFalse(compile_rules(rules)(VIDEO))
+
+    def test_round_trip(self):
+        rules = 'channel,UCa,IS,title,#shorts,CONTAINS,AND,channel,UCb,IS,OR'
+        self.assertEqual(rules_to_string(rules_from_string(rules)), rules)
+
+
+class JunctionTest(unittest.TestCase):
+    def test_and_or(self):
+        rules = 'title,#shorts,CONTAINS,description,riemann,CONTAINS,AND,channel,UCb,IS,OR'
+        match = compile_rules(rules)
+        self.assertTrue(match(VIDEO))
+        self.assertFalse(match(dict(VIDEO, plot=u'')))
+        self.assertTrue(match(dict(VIDEO, plot=u'', channel_id='UCb')))
+
+    def test_merged_equality(self):
+        # IS of one field in an OR, and IS NOT in an AND, are one lookup
+        either = compile_rules('title,a,IS,title,b,IS,OR,title,c,IS,OR')
+        neither = compile_rules('title,a,IS NOT,title,b,IS NOT,AND,title,c,IS NOT,AND')
+        for title in (u'a', u'b', u'c', u'd'):
+            self.assertEqual(either({'title': title}), title != u'd')
+            self.assertEqual(neither({'title': title}), title == u'd')
+
+    def test_folded_with_fixed_channel(self):
+        # with the channel fixed, its tests decide junctions or drop out of them
+        rules = 'channel,UCa,IS,title,#shorts,CONTAINS,AND'
+        other = compile_rules(rules, fixed={'channel': 'UCb'})
+        own = compile_rules(rules, fixed={'channel': 'UCa'})
+        self.assertFalse(other(VIDEO))
+        self.assertTrue(own(VIDEO))
+        self.assertFalse(own(dict(VIDEO, title=u'Primes')))
+
+        rules = 'channel,UCa,IS,title,#shorts,CONTAINS,OR'
+        own = compile_rules(rules, fixed={'channel': 'UCa'})
+        other = compile_rules(rules, fixed={'channel': 'UCb'})
+        self.assertTrue(own(dict(VIDEO, title=u'Primes')))
+        self.assertTrue(other(VIDEO))
+        self.assertFalse(other(dict(VIDEO, title=u'Primes')))
+
+    def test_router_folds_channels(self):
+        router = Router([('Numberphile', 'channel,UCa,IS,channel,UCb,IS,OR'),
+                         ('Shorts', 'channel,UCc,IS,title,#shorts,CONTAINS,AND'),
+                         ('Everything', 'channel,UCz,IS NOT')])
+        # every upload of a channel decided without looking at them, the first show matching wins
+        self.assertEqual(router.for_channel('UCa'), (0, None))
+        self.assertEqual(router.for_channel('UCb'), (0, None))
+        self.assertEqual(router.for_channel('UCd'), (2, None))
+        # only the title test is left for UCc
+        index, route = router.for_channel('UCc')
+        self.assertEqual(index, None)
+        uploads = [VIDEO, dict(VIDEO, title=u'Primes')]
+        self.assertEqual(router.route('UCc', uploads), ['Shorts', 'Everything'])
+        self.assertEqual(router.route('UCb', uploads), ['Numberphile', 'Numberphile'])
+
+    def test_router_channels_own_show(self):
+        router = Router([('Shorts', 'channel,UCc,IS,title,#shorts,CONTAINS,AND')])
+        self.assertEqual(router.for_channel('UCa'), (-1, None))
+        self.assertEqual(router.route('UCa', [VIDEO]), [None])
+        self.assertEqual(router.route('UCc', [VIDEO, dict(VIDEO, title=u'Primes')]), ['Shorts', None])
+
+
+class BadRulesTest(unittest.TestCase):
+    def check(self, rules):
+        with self.assertRaises(ValueError):
+            Router([('Show', rules)])
+        with self.assertRaises(ValueError):
+            compile_rules(rules)
+
+    def test_missing_operand(self):
+        self.check('title,IS')
+        self.check('title,x,CONTAINS,AND')
+
+    def test_left_over_operands(self):
+        self.check('title,x')
+        self.check('title,x,IS,title')
+
+    def test_not_a_rule(self):
+        self.check('title')
+        self.check('title,x,IS,title,AND')
+
+    def test_unknown_field(self):
+        self.check('colour,red,IS')
+
+    def test_test_as_a_field(self):
+        self.check('title,x,IS,y,CONTAINS')
+
+    def test_bad_regular_expression(self):
+        self.check('title,(,MATCHES')
+
+    def test_checked_before_routing(self):
+        # a mistake in any show shows as the Router is made, whichever channels it would apply to
+        with self.assertRaises(ValueError):
+            Router([('Good', 'channel,UCa,IS'), ('Bad', 'channel,UCb,IS,title,(,MATCHES,AND')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# syncs against benchmarks/server.py, the local stand-in for youtube, checking what ends up in the library
+#
+# usage: python -m unittest discover tests
+
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+from resources.lib.Engine import Config, Engine  # noqa: E402
+from server import Channels, StandIn  # noqa: E402
+
+VIDEO_ID_rx = re.compile(r'<video_id>([^<]*)</video_id>')
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.profile = tempfile.mkdtemp(prefix='yourtube-test-')
+        self.servers = []
+        self.engines = []
+
+    def tearDown(self):
+        for engine in self.engines:
+            engine.close()
+        for server in self.servers:
+            server.stop()
+        shutil.rmtree(self.profile, ignore_errors=True)
+
+    def serve(self, channels):
+        # start a stand-in for channels and save its takeout as the subscriptions
+        server = StandIn(channels).start()
+        self.servers.append(server)
+        self.takeout(channels)
+        return server
+
+    def takeout(self, channels):
+        with io.open(os.path.join(self.profile, 'subscriptions.rss'), 'w', encoding='utf-8') as f:
+            f.write(channels.opml())
+
+    def engine(self, server, **settings):
+        # subscriptions are read again on every sync
+        settings = dict({'request_rate': '0', 'subscriptions_ttl': '0'}, **settings)
+        engine = Engine(Config(self.profile, lambda key: settings.get(key, ''), youtube_url=server.url,
+                               log=lambda message, level: None))
+        self.engines.append(engine)
+        return engine
+
+    def episodes(self, title):
+        # returns {video_id: episode file name} of a show folder
+        folder = os.path.join(self.profile, 'TV', title)
+        episodes = {}
+        for name in os.listdir(folder):
+            if name.endswith('.nfo') and name != 'tvshow.nfo':
+                with io.open(os.path.join(folder, name), encoding='utf-8') as f:
+                    episodes[VIDEO_ID_rx.search(f.read()).group(1)] = name
+        return episodes
+
+    def test_renamed_channel_keeps_episode_numbers(self):
+        channels = Channels(1, 30)
+        server = self.serve(channels)
+        engine = self.engine(server)
+        engine.sync()
+        before = self.episodes(u'Bench Channel 0')
+        self.assertEqual(len(before), 30)
+
+        channels.title = lambda channel_id: u'Renamed 0'
+        self.takeout(channels)
+        engine.sync(force=True)
+        self.assertEqual(os.listdir(os.path.join(self.profile, 'TV')), [u'Renamed 0'])
+        self.assertEqual(self.episodes(u'Renamed 0'), before)
+
+        # and new uploads are numbered on from them
+        channels.add_uploads(2)
+        engine.sync(force=True)
+        after = self.episodes(u'Renamed 0')
+        self.assertEqual(len(after), 32)
+        self.assertEqual(dict((video_id, after[video_id]) for video_id in before), before)
+        self.assertEqual(sorted(set(after.values()) - set(before.values())), ['s01e31.nfo', 's01e32.nfo'])
+
+    def test_shared_video_goes_to_first_subscription(self):
+        # the second channel also lists the first one's newest video, and gets to claim it first
+        channels = Channels(2, 5)
+        own = channels.video_ids
+        first, second = channels.ids
+        shared = own(first)[0]
+        channels.video_ids = lambda channel_id: own(channel_id) + ([shared] if channel_id == second else [])
+        server = self.serve(channels)
+        engine = self.engine(server, channel_threads='2')
+        fetch_channel_uploads = engine.fetch_channel_uploads
+
+        def slow_first(channel_id, **kwargs):
+            if channel_id == first:
+                time.sleep(0.5)
+            return fetch_channel_uploads(channel_id, **kwargs)
+        engine.fetch_channel_uploads = slow_first
+        engine.sync()
+
+        self.assertIn(shared, self.episodes(u'Bench Channel 0'))
+        self.assertNotIn(shared, self.episodes(u'Bench Channel 1'))
+        self.assertEqual(len(self.episodes(u'Bench Channel 1')), 5)
+        self.assertEqual(engine.database().video_channels([shared]), {shared: first})
+
+
+if __name__ == '__main__':
+    unittest.main()